@@ -1,5 +1,7 @@
 import os
 
+from sqlalchemy.engine import make_url
+
 class Config:
     """Base configuration class"""
     DEBUG = False
@@ -71,3 +73,15 @@ def get_config():
     """Get the current configuration"""
     env = os.environ.get('FLASK_ENV', 'default')
     return config[env]
+
+def bulk_write_engine_options(database_uri):
+    """Get the SQLAlchemy engine options that batch executemany() writes for a database URI"""
+    # Bulk writes (score and percentile updates) pass many parameter sets per statement; let
+    # psycopg2 page UPDATE/DELETE executemany() calls and INSERTs into multi-row batches
+    if make_url(database_uri or "sqlite://").drivername in ("postgresql", "postgresql+psycopg2"):
+        return {
+            "executemany_mode": "values_plus_batch",
+            "executemany_batch_page_size": 500,
+            "insertmanyvalues_page_size": 10000,
+        }
+    return {}
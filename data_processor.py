@@ -18,126 +18,140 @@ class DataProcessor:
         self.config = get_config()
         self.dune_client = DuneClient()
     
-    def process_revenue_data(self, protocol_name):
-        """Process and store revenue data for a protocol"""
+    def process_revenue_data(self, protocol_name, commit=True):
+        """
+        Process and store revenue data for a protocol.
+        
+        Runs inside a SAVEPOINT so a failure only discards this protocol's changes;
+        pass commit=False to leave the commit to the caller.
+        """
         try:
-            protocol = Protocol.query.filter_by(name=protocol_name).first()
-            if not protocol:
-                logger.error(f"Protocol {protocol_name} not found in database")
-                return False
-            
-            # Get revenue data from Dune Analytics
-            revenue_df = self.dune_client.get_monthly_revenue_data(protocol_name)
-            if revenue_df is None or revenue_df.empty:
-                logger.error(f"Failed to get revenue data for {protocol_name}")
-                return False
-            
-            # Process each month's data
-            for _, row in revenue_df.iterrows():
-                month_date = pd.to_datetime(row['month']).date()
-                
-                # Check if we already have data for this month
-                existing_data = RevenueData.query.filter_by(
-                    protocol_id=protocol.id,
-                    month=month_date,
-                    revenue_source=row.get('source', 'total')
-                ).first()
-                
-                # Get stability score metrics
-                stability_score = row.get('mom_change', 0)
+            with db.session.begin_nested():
+                protocol = Protocol.query.filter_by(name=protocol_name).first()
+                if not protocol:
+                    logger.error(f"Protocol {protocol_name} not found in database")
+                    return False
                 
-                # Prepare magnitude score calculation data
-                avg_mom_change = row.get('avg_mom_change')
-                stddev_mom_change = row.get('stddev_mom_change')
+                # Get revenue data from Dune Analytics
+                revenue_df = self.dune_client.get_monthly_revenue_data(protocol_name)
+                if revenue_df is None or revenue_df.empty:
+                    logger.error(f"Failed to get revenue data for {protocol_name}")
+                    return False
                 
-                # Calculate a magnitude score based on revenue volume compared to historical values
-                # Higher revenue is better, normalized vs historical values
-                # For now, we'll use the stability_score as a proxy
-                # In a future enhancement, this could be compared against other protocols in the same category
-                
-                if existing_data:
-                    # Update existing record
-                    existing_data.revenue = row['total_fees']
-                    existing_data.stability_score = stability_score
-                else:
-                    # Create new record
-                    new_data = RevenueData(
+                # Process each month's data
+                for _, row in revenue_df.iterrows():
+                    month_date = pd.to_datetime(row['month']).date()
+                    
+                    # Check if we already have data for this month
+                    existing_data = RevenueData.query.filter_by(
                         protocol_id=protocol.id,
                         month=month_date,
-                        revenue=row['total_fees'],
-                        revenue_source=row.get('source', 'total'),
-                        stability_score=stability_score
-                    )
-                    db.session.add(new_data)
-            
-            # Calculate and update magnitude score relative to category peers
-            self._calculate_revenue_magnitude(protocol)
-            
-            # Commit changes
-            db.session.commit()
+                        revenue_source=row.get('source', 'total')
+                    ).first()
+                    
+                    # Get stability score metrics
+                    stability_score = row.get('mom_change', 0)
+                    
+                    # Prepare magnitude score calculation data
+                    avg_mom_change = row.get('avg_mom_change')
+                    stddev_mom_change = row.get('stddev_mom_change')
+                    
+                    # Calculate a magnitude score based on revenue volume compared to historical values
+                    # Higher revenue is better, normalized vs historical values
+                    # For now, we'll use the stability_score as a proxy
+                    # In a future enhancement, this could be compared against other protocols in the same category
+                    
+                    if existing_data:
+                        # Update existing record
+                        existing_data.revenue = row['total_fees']
+                        existing_data.stability_score = stability_score
+                    else:
+                        # Create new record
+                        new_data = RevenueData(
+                            protocol_id=protocol.id,
+                            month=month_date,
+                            revenue=row['total_fees'],
+                            revenue_source=row.get('source', 'total'),
+                            stability_score=stability_score
+                        )
+                        db.session.add(new_data)
+                
+                # Calculate and update magnitude score relative to category peers
+                self._calculate_revenue_magnitude(protocol)
+                
+            if commit:
+                db.session.commit()
             return True
             
         except Exception as e:
-            db.session.rollback()
+            if commit:
+                db.session.rollback()
             logger.error(f"Error processing revenue data for {protocol_name}: {str(e)}")
             return False
     
-    def process_user_data(self, protocol_name):
-        """Process and store user growth data for a protocol"""
+    def process_user_data(self, protocol_name, commit=True):
+        """
+        Process and store user growth data for a protocol.
+        
+        Runs inside a SAVEPOINT so a failure only discards this protocol's changes;
+        pass commit=False to leave the commit to the caller.
+        """
         try:
-            protocol = Protocol.query.filter_by(name=protocol_name).first()
-            if not protocol:
-                logger.error(f"Protocol {protocol_name} not found in database")
-                return False
-            
-            # Get user growth data from Dune Analytics
-            user_df = self.dune_client.get_user_growth_data(protocol_name)
-            if user_df is None or user_df.empty:
-                logger.error(f"Failed to get user data for {protocol_name}")
-                return False
-            
-            # Process each month's data
-            for _, row in user_df.iterrows():
-                month_date = pd.to_datetime(row['month']).date()
-                
-                # Check if we already have data for this month
-                existing_data = UserData.query.filter_by(
-                    protocol_id=protocol.id,
-                    month=month_date
-                ).first()
+            with db.session.begin_nested():
+                protocol = Protocol.query.filter_by(name=protocol_name).first()
+                if not protocol:
+                    logger.error(f"Protocol {protocol_name} not found in database")
+                    return False
                 
-                # Prepare data dictionary
-                data = {
-                    'active_addresses': row.get('active_addresses', 0),
-                    'transaction_count': row.get('transaction_count', 0),
-                    'transaction_volume': row.get('transaction_volume', 0),
-                    'active_address_growth': row.get('active_address_growth_rate', 0),
-                    'transaction_count_growth': row.get('transaction_count_growth_rate', 0),
-                    'transaction_volume_growth': row.get('transaction_volume_growth_rate', 0),
-                    'active_address_percentile': row.get('active_address_percentile', 0),
-                    'transaction_count_percentile': row.get('transaction_count_percentile', 0),
-                    'transaction_volume_percentile': row.get('transaction_volume_percentile', 0)
-                }
+                # Get user growth data from Dune Analytics
+                user_df = self.dune_client.get_user_growth_data(protocol_name)
+                if user_df is None or user_df.empty:
+                    logger.error(f"Failed to get user data for {protocol_name}")
+                    return False
                 
-                if existing_data:
-                    # Update existing record
-                    for key, value in data.items():
-                        setattr(existing_data, key, value)
-                else:
-                    # Create new record
-                    new_data = UserData(
+                # Process each month's data
+                for _, row in user_df.iterrows():
+                    month_date = pd.to_datetime(row['month']).date()
+                    
+                    # Check if we already have data for this month
+                    existing_data = UserData.query.filter_by(
                         protocol_id=protocol.id,
-                        month=month_date,
-                        **data
-                    )
-                    db.session.add(new_data)
-            
-            # Commit changes
-            db.session.commit()
+                        month=month_date
+                    ).first()
+                    
+                    # Prepare data dictionary
+                    data = {
+                        'active_addresses': row.get('active_addresses', 0),
+                        'transaction_count': row.get('transaction_count', 0),
+                        'transaction_volume': row.get('transaction_volume', 0),
+                        'active_address_growth': row.get('active_address_growth_rate', 0),
+                        'transaction_count_growth': row.get('transaction_count_growth_rate', 0),
+                        'transaction_volume_growth': row.get('transaction_volume_growth_rate', 0),
+                        'active_address_percentile': row.get('active_address_percentile', 0),
+                        'transaction_count_percentile': row.get('transaction_count_percentile', 0),
+                        'transaction_volume_percentile': row.get('transaction_volume_percentile', 0)
+                    }
+                    
+                    if existing_data:
+                        # Update existing record
+                        for key, value in data.items():
+                            setattr(existing_data, key, value)
+                    else:
+                        # Create new record
+                        new_data = UserData(
+                            protocol_id=protocol.id,
+                            month=month_date,
+                            **data
+                        )
+                        db.session.add(new_data)
+                
+            if commit:
+                db.session.commit()
             return True
             
         except Exception as e:
-            db.session.rollback()
+            if commit:
+                db.session.rollback()
             logger.error(f"Error processing user data for {protocol_name}: {str(e)}")
             return False
     
@@ -170,12 +184,21 @@ class DataProcessor:
         protocols = Protocol.query.all()
         
         success_count = 0
-        for protocol in protocols:
-            revenue_success = self.process_revenue_data(protocol.name)
-            user_success = self.process_user_data(protocol.name)
+        try:
+            for protocol in protocols:
+                revenue_success = self.process_revenue_data(protocol.name, commit=False)
+                user_success = self.process_user_data(protocol.name, commit=False)
+                
+                if revenue_success and user_success:
+                    success_count += 1
             
-            if revenue_success and user_success:
-                success_count += 1
+            # One commit for the whole run instead of two per protocol
+            db.session.commit()
+            
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error(f"Database error updating protocols: {str(e)}")
+            return 0
                 
         logger.info(f"Updated {success_count}/{len(protocols)} protocols successfully")
         return success_count
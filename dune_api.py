@@ -294,12 +294,18 @@ WITH monthly_active_addresses AS (
       t1.transaction_volume - t2.transaction_volume
     ) / NULLIF(t2.transaction_volume, 0) * 100 AS transaction_volume_growth_rate
   FROM monthly_active_addresses AS m1
-  LEFT JOIN monthly_active_addresses AS m2
-    ON m1.month = m2.month + INTERVAL '1' MONTH
+  LEFT JOIN (
+    SELECT month + INTERVAL '1' MONTH AS month, active_addresses
+    FROM monthly_active_addresses
+  ) AS m2
+    ON m1.month = m2.month
   LEFT JOIN transaction_count_volume AS t1
     ON m1.month = t1.month
-  LEFT JOIN transaction_count_volume AS t2
-    ON t1.month = t2.month + INTERVAL '1' MONTH
+  LEFT JOIN (
+    SELECT month + INTERVAL '1' MONTH AS month, transaction_count, transaction_volume
+    FROM transaction_count_volume
+  ) AS t2
+    ON t1.month = t2.month
 ), percentile_ranking AS (
   SELECT
     month,
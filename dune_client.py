@@ -1,6 +1,8 @@
 import os
 import requests
+from requests.adapters import HTTPAdapter
 import logging
+import threading
 import time
 from datetime import datetime, timedelta
 import pandas as pd
@@ -9,9 +11,33 @@ from config import get_config
 
 logger = logging.getLogger(__name__)
 
+def _create_session():
+    """Create an HTTP session whose pooled keep-alive connections are reused across requests"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=20, pool_maxsize=50)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# requests.Session is not thread-safe, so each thread (e.g. the scoring executor's workers)
+# gets its own session, shared by every client created on that thread
+_thread_local = threading.local()
+
+def _get_session():
+    """Get the current thread's HTTP session, creating it on first use"""
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = _thread_local.session = _create_session()
+    return session
+
 class DuneClient:
     """Client for interacting with Dune Analytics API"""
     
+    @property
+    def _session(self):
+        """Session reused across requests so execution, polling and result calls skip new TLS handshakes"""
+        return _get_session()
+    
     def __init__(self):
         self.config = get_config()
         self.api_key = self.config.DUNE_API_KEY
@@ -21,7 +47,7 @@ class DuneClient:
             "Content-Type": "application/json"
         }
     
-    def execute_query(self, query_id):
+    def execute_query(self, query_id, query_parameters=None):
         """Execute a query on Dune Analytics and return results"""
         if not self.api_key:
             logger.warning("Dune API key not found. Using synthetic data for testing.")
@@ -30,7 +56,8 @@ class DuneClient:
         try:
             # Start query execution
             execution_url = f"{self.base_url}/query/{query_id}/execute"
-            response = requests.post(execution_url, headers=self.headers)
+            payload = {"query_parameters": query_parameters} if query_parameters else None
+            response = self._session.post(execution_url, headers=self.headers, json=payload)
             response.raise_for_status()
             
             execution_id = response.json().get("execution_id")
@@ -50,12 +77,12 @@ class DuneClient:
                 time.sleep(wait_time)
                 wait_time *= 1.5  # Exponential backoff
                 
-                status_response = requests.get(status_url, headers=self.headers)
+                status_response = self._session.get(status_url, headers=self.headers)
                 status_response.raise_for_status()
                 
                 status = status_response.json().get("state")
                 if status == "QUERY_STATE_COMPLETED":
-                    results_response = requests.get(results_url, headers=self.headers)
+                    results_response = self._session.get(results_url, headers=self.headers)
                     results_response.raise_for_status()
                     
                     result_data = results_response.json().get("result", {}).get("rows", [])
@@ -72,8 +99,8 @@ class DuneClient:
             logger.error(f"Error executing Dune query {query_id}: {str(e)}")
             return None
     
-    def execute_custom_query(self, query_text):
-        """Execute a custom SQL query on Dune Analytics"""
+    def execute_custom_query(self, query_text, query_parameters=None):
+        """Execute a custom SQL query on Dune Analytics, optionally binding {{name}} query parameters"""
         if not self.api_key:
             logger.warning("Dune API key not found. Using synthetic data for testing.")
             return None
@@ -85,8 +112,17 @@ class DuneClient:
                 "query": query_text,
                 "name": f"How3.io Query {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
             }
+            if query_parameters:
+                create_payload["parameters"] = [
+                    {
+                        "key": key,
+                        "type": "number" if isinstance(value, (int, float)) else "text",
+                        "value": str(value)
+                    }
+                    for key, value in query_parameters.items()
+                ]
             
-            create_response = requests.post(create_url, headers=self.headers, json=create_payload)
+            create_response = self._session.post(create_url, headers=self.headers, json=create_payload)
             create_response.raise_for_status()
             
             query_id = create_response.json().get("query_id")
@@ -95,7 +131,7 @@ class DuneClient:
                 return None
             
             # Execute the created query
-            return self.execute_query(query_id)
+            return self.execute_query(query_id, query_parameters)
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Error executing custom Dune query: {str(e)}")
@@ -104,14 +140,18 @@ class DuneClient:
     def get_monthly_revenue_data(self, protocol, months=12):
         """Get monthly revenue data for a protocol"""
         # Try to get real data from Dune
-        from query_templates import get_revenue_query
-        query_text = get_revenue_query(protocol, months)
-        
-        # If we have an API key, try to execute the query
-        if self.api_key:
-            result = self.execute_custom_query(query_text)
-            if result is not None and not result.empty:
-                return result
+        from query_templates import get_parameterized_revenue_query
+        try:
+            query_text, query_parameters = get_parameterized_revenue_query(protocol, months)
+        except ValueError as e:
+            # Names that cannot be used in a query still get synthetic data below
+            logger.warning(f"Cannot build revenue query for {protocol}: {str(e)}")
+        else:
+            # If we have an API key, try to execute the query
+            if self.api_key:
+                result = self.execute_custom_query(query_text, query_parameters)
+                if result is not None and not result.empty:
+                    return result
         
         # Otherwise, generate synthetic data for testing purposes
         logger.info(f"Using synthetic revenue data for {protocol}")
@@ -120,14 +160,18 @@ class DuneClient:
     def get_user_growth_data(self, protocol, months=12):
         """Get monthly user growth data for a protocol"""
         # Try to get real data from Dune
-        from query_templates import get_user_growth_query
-        query_text = get_user_growth_query(protocol, months)
-        
-        # If we have an API key, try to execute the query
-        if self.api_key:
-            result = self.execute_custom_query(query_text)
-            if result is not None and not result.empty:
-                return result
+        from query_templates import get_parameterized_user_growth_query
+        try:
+            query_text, query_parameters = get_parameterized_user_growth_query(protocol, months)
+        except ValueError as e:
+            # Names that cannot be used in a query still get synthetic data below
+            logger.warning(f"Cannot build user growth query for {protocol}: {str(e)}")
+        else:
+            # If we have an API key, try to execute the query
+            if self.api_key:
+                result = self.execute_custom_query(query_text, query_parameters)
+                if result is not None and not result.empty:
+                    return result
         
         # Otherwise, generate synthetic data for testing purposes
         logger.info(f"Using synthetic user growth data for {protocol}")
@@ -149,45 +193,35 @@ class DuneClient:
         volatility = profile["volatility"]
         
         today = datetime.now()
-        data = []
-        mom_changes = []
+        offsets = np.arange(months)
+        month_strs = [(today - timedelta(days=30*i)).strftime("%Y-%m-01") for i in range(months)]
         
-        for i in range(months):
-            month_date = today - timedelta(days=30*i)
-            month_str = month_date.strftime("%Y-%m-01")
-            
-            # Generate revenue with growth trend and some volatility
-            trend_factor = (1 + monthly_growth) ** (months - i)
-            random_factor = 1 + np.random.uniform(-volatility, volatility)
-            monthly_revenue = base_revenue * trend_factor * random_factor
-            
-            # Calculate month-over-month change if not the first month
-            mom_change = None
-            if i > 0:
-                prev_month = data[-1]["total_fees"]
-                mom_change = (monthly_revenue - prev_month) / prev_month
-                mom_changes.append(mom_change)
-            
-            data.append({
-                "month": month_str,
-                "total_fees": monthly_revenue,
-                "source": "total",
-                "mom_change": mom_change
-            })
+        # Generate revenue with growth trend and some volatility for all months at once
+        trend_factor = (1 + monthly_growth) ** (months - offsets)
+        random_factor = 1 + np.random.uniform(-volatility, volatility, size=months)
+        revenues = base_revenue * trend_factor * random_factor
+        
+        # Month-over-month change against the previously generated month (none for the first)
+        mom_changes = np.full(months, np.nan)
+        mom_changes[1:] = (revenues[1:] - revenues[:-1]) / revenues[:-1]
         
         # Add stability and magnitude scores
-        avg_mom_change = np.mean(mom_changes) if mom_changes else 0
-        stddev_mom_change = np.std(mom_changes) if mom_changes else 0
+        valid_changes = mom_changes[1:]
+        avg_mom_change = valid_changes.mean() if valid_changes.size else 0
+        stddev_mom_change = valid_changes.std() if valid_changes.size else 0
         
-        # Add these metrics to all rows
-        for row in data:
-            row["avg_mom_change"] = avg_mom_change
-            row["stddev_mom_change"] = stddev_mom_change
-            row["num_months"] = len(mom_changes)
+        df = pd.DataFrame({
+            "month": month_strs,
+            "total_fees": revenues,
+            "source": "total",
+            "mom_change": mom_changes,
+            "avg_mom_change": avg_mom_change,
+            "stddev_mom_change": stddev_mom_change,
+            "num_months": valid_changes.size
+        })
         
-        # Convert to pandas DataFrame and reverse order (oldest first)
-        df = pd.DataFrame(data[::-1])
-        return df
+        # Reverse order (oldest first)
+        return df.iloc[::-1].reset_index(drop=True)
     
     def _generate_synthetic_user_data(self, protocol, months):
         """Generate synthetic user growth data for testing"""
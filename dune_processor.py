@@ -10,13 +10,31 @@ import numpy as np
 from typing import Dict, List, Any, Optional, Callable, Union
 from datetime import datetime, timedelta
 
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
 from dune_client import DuneClient
+from eqs_kernels import LOG_REFERENCE_REVENUE
 from protocol_config import PROTOCOL_CONFIGS, CATEGORY_SETTINGS, SCORE_WEIGHTS, EQS_WEIGHTS, UGS_WEIGHTS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Percentile columns and log10 offsets used to score each UGS metric
+UGS_PERCENTILE_COLUMNS = {
+    'active_addresses': 'active_address_percentile',
+    'transaction_count': 'transaction_count_percentile',
+    'transaction_volume': 'transaction_volume_percentile'
+}
+UGS_LOG_OFFSETS = {
+    'active_addresses': 0,
+    'transaction_count': 0,
+    'transaction_volume': 3
+}
+
 class DuneProcessor:
     """
     Centralized processor for Dune Analytics data, handling multiple protocols and query types.
@@ -147,10 +165,11 @@ class DuneProcessor:
                 logger.warning(f"No data returned for query ID {query_id}")
                 return {'result': {'rows': []}}
             
-            # Convert DataFrame to expected dict format
+            # Wrap the DataFrame in the expected dict format; consumers take views of
+            # this single frame instead of re-parsing a list of row dicts
             result_dict = {
                 'result': {
-                    'rows': df_result.to_dict(orient='records')
+                    'frame': df_result
                 }
             }
             
@@ -172,13 +191,21 @@ class DuneProcessor:
         Returns:
             Processed DataFrame
         """
-        if not raw_data or 'result' not in raw_data or 'rows' not in raw_data['result']:
+        result = raw_data.get('result', {}) if raw_data else {}
+        
+        if 'frame' in result:
+            # Shallow view of the shared frame; later column assignments don't modify the cached copy
+            df = result['frame'].copy(deep=False)
+        elif 'rows' in result:
+            # Create DataFrame from query result rows, parsing through Arrow when available
+            if pa is not None and result['rows']:
+                df = pa.Table.from_pylist(result['rows']).to_pandas()
+            else:
+                df = pd.DataFrame(result['rows'])
+        else:
             logger.warning(f"No data to process for {query_type}")
             return pd.DataFrame()
         
-        # Create DataFrame from query result
-        df = pd.DataFrame(raw_data['result']['rows'])
-        
         if df.empty:
             logger.warning(f"Empty DataFrame for {query_type}")
             return df
@@ -201,6 +228,15 @@ class DuneProcessor:
         if df.empty:
             return df
         
+        # Store the small fixed set of revenue sources as categorical codes
+        if 'source' in df.columns:
+            df['source'] = df['source'].astype('category')
+        
+        # Monetary columns fit comfortably in float32, halving memory traffic in aggregations
+        for col in ('total_fees', 'transaction_volume'):
+            if col in df.columns:
+                df[col] = df[col].astype(np.float32, copy=False)
+        
         # Ensure required columns exist
         required_cols = ['month', 'total_fees', 'mom_change']
         missing_cols = [col for col in required_cols if col not in df.columns]
@@ -304,10 +340,7 @@ class DuneProcessor:
         # Calculate P/S ratio if not present
         if 'market_cap' in df.columns and 'annual_revenue' in df.columns and 'ps_ratio' not in df.columns:
             try:
-                df['ps_ratio'] = df.apply(
-                    lambda row: row['market_cap'] / row['annual_revenue'] if row['annual_revenue'] > 0 else None,
-                    axis=1
-                )
+                df['ps_ratio'] = (df['market_cap'] / df['annual_revenue']).where(df['annual_revenue'] > 0)
             except Exception as e:
                 logger.error(f"Error calculating P/S ratio: {str(e)}")
         
@@ -448,12 +481,9 @@ class DuneProcessor:
                 recent_data = df[df['month'] == recent_month]
                 total_revenue = recent_data['total_fees'].sum()
                 
-                # Use a reference value for "large revenue"
-                reference_revenue = 5000000  # $5M monthly revenue as reference
-                
-                # Log scale for better distribution
+                # Log scale for better distribution, against a $5M monthly reference revenue
                 if total_revenue > 0:
-                    magnitude_score = min(100, 100 * np.log(total_revenue + 1) / np.log(reference_revenue + 1))
+                    magnitude_score = min(100, 100 * np.log(total_revenue + 1) / LOG_REFERENCE_REVENUE)
             
             # Calculate diversification score if possible
             diversification_score = None
@@ -465,7 +495,7 @@ class DuneProcessor:
                 recent_data = df[df['month'] == recent_month]
                 
                 # Get revenue by source
-                revenue_by_source = recent_data.groupby('source')['total_fees'].sum()
+                revenue_by_source = recent_data.groupby('source', observed=True)['total_fees'].sum()
                 
                 # Calculate standard deviation and mean for diversification
                 diversification_std = revenue_by_source.std()
@@ -512,65 +542,31 @@ class DuneProcessor:
             # Get most recent month's data
             recent_data = df.sort_values('month', ascending=False).iloc[0]
             
-            scores = {}
-            
-            # Calculate active addresses score
-            if 'active_addresses' in df.columns and 'active_address_percentile' in df.columns:
-                scores['active_addresses'] = recent_data['active_address_percentile'] * 100
-            elif 'active_addresses' in df.columns:
-                # Estimate score based on absolute value (logarithmic scale)
-                # 100 users -> ~25 points
-                # 1,000 users -> ~50 points
-                # 10,000 users -> ~75 points
-                # 100,000+ users -> 100 points
-                active_addresses = recent_data['active_addresses']
-                if active_addresses > 0:
-                    scores['active_addresses'] = min(100, max(0, 25 * np.log10(active_addresses)))
-                else:
-                    scores['active_addresses'] = 0
-            
-            # Calculate transaction count score
-            if 'transaction_count' in df.columns and 'transaction_count_percentile' in df.columns:
-                scores['transaction_count'] = recent_data['transaction_count_percentile'] * 100
-            elif 'transaction_count' in df.columns:
-                # Estimate score based on absolute value (logarithmic scale)
-                tx_count = recent_data['transaction_count']
-                if tx_count > 0:
-                    scores['transaction_count'] = min(100, max(0, 25 * np.log10(tx_count)))
-                else:
-                    scores['transaction_count'] = 0
-            
-            # Calculate transaction volume score
-            if 'transaction_volume' in df.columns and 'transaction_volume_percentile' in df.columns:
-                scores['transaction_volume'] = recent_data['transaction_volume_percentile'] * 100
-            elif 'transaction_volume' in df.columns:
-                # Estimate score based on absolute value (logarithmic scale)
-                # $10k volume -> ~25 points
-                # $100k volume -> ~50 points
-                # $1M volume -> ~75 points
-                # $10M+ volume -> 100 points
-                tx_volume = recent_data['transaction_volume']
-                if tx_volume > 0:
-                    scores['transaction_volume'] = min(100, max(0, 25 * (np.log10(tx_volume) - 3)))
-                else:
-                    scores['transaction_volume'] = 0
-            
-            # Combine scores using weights from config
-            total_score = 0
-            total_weight = 0
-            
-            for metric, weight in UGS_WEIGHTS.items():
-                if metric in scores:
-                    total_score += scores[metric] * weight
-                    total_weight += weight
-            
-            if total_weight > 0:
-                ugs_score = total_score / total_weight
-                return round(ugs_score, 2)
-            else:
+            metrics = [metric for metric in UGS_WEIGHTS if metric in df.columns]
+            if not metrics:
                 logger.warning("No metrics available for UGS calculation")
                 return None
             
+            # Estimate scores from absolute values on a logarithmic scale:
+            # 100 users / txs -> ~25 points, 100,000+ -> 100 points
+            # $10k volume -> ~25 points, $10M+ volume -> 100 points
+            values = recent_data[metrics].to_numpy(dtype=np.float64)
+            offsets = np.array([UGS_LOG_OFFSETS[metric] for metric in metrics])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                estimated = np.clip(25 * (np.log10(values) - offsets), 0, 100)
+            estimated = np.where(values > 0, estimated, 0)
+            
+            # Prefer category percentile ranks where they are available
+            percentile_cols = [UGS_PERCENTILE_COLUMNS[metric] for metric in metrics]
+            has_percentile = np.array([col in df.columns for col in percentile_cols])
+            percentiles = recent_data.reindex(percentile_cols).to_numpy(dtype=np.float64) * 100
+            scores = np.where(has_percentile, percentiles, estimated)
+            
+            # Combine scores using weights from config
+            weights = np.array([UGS_WEIGHTS[metric] for metric in metrics])
+            ugs_score = scores @ weights / weights.sum()
+            return round(float(ugs_score), 2)
+            
         except Exception as e:
             logger.error(f"Error calculating UGS: {str(e)}")
             return None
@@ -600,30 +596,37 @@ class DuneProcessor:
                 return None
             
             # Calculate FVS based on P/S ratio
-            # Lower P/S ratio is generally better (more revenue relative to market cap)
-            # We'll use a logarithmic scale to avoid extreme scores
-            
-            # Typical P/S ratios for crypto protocols range from 1 to 100+
-            # P/S ratio of 5 -> ~80 points (excellent value)
-            # P/S ratio of 20 -> ~60 points (good value)
-            # P/S ratio of 50 -> ~40 points (fair value)
-            # P/S ratio of 100 -> ~20 points (overvalued)
-            
-            # Normalize score (0-100, higher is better value)
-            if ps_ratio < 1:
-                fvs_score = 100  # Extremely undervalued
-            else:
-                # Logarithmic scale
-                log_ps = np.log10(ps_ratio)
-                normalized_score = max(0, 100 - (log_ps * 40))
-                fvs_score = normalized_score
+            fvs_score = self._score_ps_ratios(ps_ratio)
             
-            return round(fvs_score, 2)
+            return round(float(fvs_score), 2)
             
         except Exception as e:
             logger.error(f"Error calculating FVS: {str(e)}")
             return None
     
+    @staticmethod
+    def _score_ps_ratios(ps_ratios):
+        """
+        Map P/S ratios to Fair Value Scores without per-value branching.
+        
+        Lower P/S ratio is generally better (more revenue relative to market cap).
+        Ratios below 1 score 100 (extremely undervalued); above that a logarithmic
+        scale avoids extreme scores. Typical P/S ratios for crypto protocols range from 1 to 100+:
+        P/S ratio of 5 -> ~80 points (excellent value)
+        P/S ratio of 20 -> ~60 points (good value)
+        P/S ratio of 50 -> ~40 points (fair value)
+        P/S ratio of 100 -> ~20 points (overvalued)
+        
+        Args:
+            ps_ratios: P/S ratio or array of P/S ratios
+        
+        Returns:
+            FVS score(s) (0-100), NaN for missing or non-positive ratios
+        """
+        ps_ratios = np.asarray(ps_ratios, dtype=np.float64)
+        fvs_scores = np.clip(100 - 40 * np.log10(np.maximum(ps_ratios, 1)), 0, 100)
+        return np.where(ps_ratios > 0, fvs_scores, np.nan)
+    
     def _estimate_fvs_from_eqs(self, eqs_df: pd.DataFrame, category: str) -> Optional[float]:
         """
         Estimate Fair Value Score based on EQS data and category averages.
@@ -659,15 +662,9 @@ class DuneProcessor:
             ps_ratio = avg_revenue_multiple  # By definition
             
             # Calculate FVS score (same logic as _calculate_fvs)
-            if ps_ratio < 1:
-                fvs_score = 100  # Extremely undervalued
-            else:
-                # Logarithmic scale
-                log_ps = np.log10(ps_ratio)
-                normalized_score = max(0, 100 - (log_ps * 40))
-                fvs_score = normalized_score
+            fvs_score = self._score_ps_ratios(ps_ratio)
             
-            return round(fvs_score, 2)
+            return round(float(fvs_score), 2)
             
         except Exception as e:
             logger.error(f"Error estimating FVS from EQS: {str(e)}")
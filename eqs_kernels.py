@@ -0,0 +1,178 @@
+"""
+Fused EQS component kernels for batch scoring across protocols.
+Computes stability, diversification and magnitude scores in a single pass over raw NumPy arrays,
+compiled with Numba when it is installed and falling back to plain Python otherwise.
+"""
+
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit when Numba is not installed."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+# $5M monthly revenue as a reference point (matches EnhancedEQSCalculator)
+REFERENCE_REVENUE = 5000000.0
+LOG_REFERENCE_REVENUE = float(np.log(REFERENCE_REVENUE + 1.0))
+
+
+@njit(parallel=True, cache=True)
+def eqs_batch(offsets, months, sources, fees, mom_change):
+    """
+    Calculate EQS component scores for many protocols at once.
+
+    Rows for protocol p live in the half-open slice offsets[p]:offsets[p + 1] of each array.
+
+    Args:
+        offsets: int64 array of length n_protocols + 1 with row boundaries
+        months: int64 array of month timestamps (e.g. datetime64[ns] as int64)
+        sources: int64 array of source codes (-1 for missing)
+        fees: float64 array of total_fees
+        mom_change: float64 array of month-over-month changes (NaN for missing)
+
+    Returns:
+        Tuple of (stability, diversification, magnitude) float64 arrays, one entry per protocol
+    """
+    n_protocols = len(offsets) - 1
+    n_sources = 1
+    for i in range(len(sources)):
+        if sources[i] + 1 > n_sources:
+            n_sources = sources[i] + 1
+
+    stability = np.empty(n_protocols, dtype=np.float64)
+    diversification = np.empty(n_protocols, dtype=np.float64)
+    magnitude = np.empty(n_protocols, dtype=np.float64)
+
+    for p in prange(n_protocols):
+        start = offsets[p]
+        end = offsets[p + 1]
+
+        # Stability: mean absolute month-over-month change, ignoring missing values
+        abs_sum = 0.0
+        valid = 0
+        latest_month = months[start] if end > start else 0
+        for i in range(start, end):
+            change = mom_change[i]
+            if not np.isnan(change):
+                abs_sum += abs(change)
+                valid += 1
+            if months[i] > latest_month:
+                latest_month = months[i]
+
+        if valid == 0:
+            stability[p] = 50.0  # Default neutral score
+        else:
+            stability[p] = min(100.0, max(0.0, 100.0 - (abs_sum / valid) * 100.0))
+
+        # Magnitude and diversification both look at the most recent month only
+        source_fees = np.zeros(n_sources, dtype=np.float64)
+        source_seen = np.zeros(n_sources, dtype=np.bool_)
+        total_revenue = 0.0
+        for i in range(start, end):
+            if months[i] != latest_month:
+                continue
+            fee = fees[i]
+            if not np.isnan(fee):
+                total_revenue += fee
+            code = sources[i]
+            if code >= 0:
+                source_seen[code] = True
+                if not np.isnan(fee):
+                    source_fees[code] += fee
+
+        if total_revenue <= 0:
+            magnitude[p] = 10.0  # Minimum score instead of zero
+        else:
+            score = 100.0 * np.log(total_revenue + 1.0) / LOG_REFERENCE_REVENUE
+            magnitude[p] = min(100.0, max(0.0, score))
+
+        # Diversification: coefficient of variation of revenue across sources
+        n_active = 0
+        fee_sum = 0.0
+        for s in range(n_sources):
+            if source_seen[s]:
+                n_active += 1
+                fee_sum += source_fees[s]
+
+        if n_active <= 1:
+            diversification[p] = 0.0
+            continue
+
+        mean = fee_sum / n_active
+        if mean <= 0:
+            diversification[p] = 0.0
+            continue
+
+        sq_sum = 0.0
+        for s in range(n_sources):
+            if source_seen[s]:
+                sq_sum += (source_fees[s] - mean) ** 2
+        std = np.sqrt(sq_sum / (n_active - 1))
+        diversification[p] = min(100.0, 50.0 * std / mean)
+
+    return stability, diversification, magnitude
+
+
+def frames_to_arrays(frames: List[pd.DataFrame]) -> Tuple[np.ndarray, ...]:
+    """
+    Concatenate per-protocol EQS DataFrames into the flat arrays expected by eqs_batch.
+
+    Args:
+        frames: List of DataFrames with month, source, total_fees and mom_change columns
+
+    Returns:
+        Tuple of (offsets, months, sources, fees, mom_change) arrays
+    """
+    lengths = np.fromiter((len(df) for df in frames), dtype=np.int64, count=len(frames))
+    offsets = np.zeros(len(frames) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    if not frames or offsets[-1] == 0:
+        empty_int = np.empty(0, dtype=np.int64)
+        empty_float = np.empty(0, dtype=np.float64)
+        return offsets, empty_int, empty_int, empty_float, empty_float
+
+    combined = pd.concat(frames, ignore_index=True)
+    months = pd.to_datetime(combined['month']).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    sources = pd.factorize(combined['source'])[0].astype(np.int64)
+    fees = pd.to_numeric(combined['total_fees'], errors='coerce').to_numpy(dtype=np.float64)
+    mom_change = pd.to_numeric(combined['mom_change'], errors='coerce').to_numpy(dtype=np.float64)
+
+    return offsets, months, sources, fees, mom_change
+
+
+def calculate_eqs_components(frames: Dict[str, pd.DataFrame]) -> Dict[str, Dict[str, float]]:
+    """
+    Calculate stability, diversification and magnitude scores for several protocols in one batch.
+
+    Args:
+        frames: Dictionary with protocol names as keys and EQS DataFrames as values
+
+    Returns:
+        Dictionary with protocol names as keys and component score dictionaries as values
+    """
+    names = list(frames.keys())
+    stability, diversification, magnitude = eqs_batch(*frames_to_arrays([frames[name] for name in names]))
+
+    return {
+        name: {
+            'stability': float(stability[i]),
+            'diversification': float(diversification[i]),
+            'magnitude': float(magnitude[i])
+        }
+        for i, name in enumerate(names)
+    }
@@ -7,6 +7,7 @@ import pandas as pd
 import numpy as np
 import logging
 from typing import Dict, List, Optional, Tuple, Any
+from eqs_kernels import calculate_eqs_components, LOG_REFERENCE_REVENUE
 
 logger = logging.getLogger(__name__)
 
@@ -34,7 +35,7 @@ class EnhancedEQSCalculator:
             EQS score (0-100) or None if insufficient data
         """
         if df.empty:
-            logger.warning(f"No revenue data available for {protocol_name}")
+            logger.warning("No revenue data available for %s", protocol_name)
             return None
             
         try:
@@ -44,20 +45,20 @@ class EnhancedEQSCalculator:
             missing_columns = [col for col in expected_columns if col not in df.columns]
             
             if missing_columns:
-                logger.warning(f"Missing required columns for {protocol_name}: {missing_columns}. Available: {df.columns.tolist()}")
+                logger.warning("Missing required columns for %s: %s. Available: %s", protocol_name, missing_columns, df.columns.tolist())
                 return None
                 
             # Calculate stability score based on revenue trend volatility
             stability_score = self._calculate_stability_score(df)
-            logger.info(f"{protocol_name} stability score: {stability_score:.2f}")
+            logger.info("%s stability score: %.2f", protocol_name, stability_score)
             
             # Calculate diversification score based on revenue distribution across sources
             diversification_score = self._calculate_diversification_score(df)
-            logger.info(f"{protocol_name} diversification score: {diversification_score:.2f}")
+            logger.info("%s diversification score: %.2f", protocol_name, diversification_score)
             
             # Calculate magnitude score for weighting
             magnitude_score = self._calculate_magnitude_score(df)
-            logger.info(f"{protocol_name} magnitude score: {magnitude_score:.2f}")
+            logger.info("%s magnitude score: %.2f", protocol_name, magnitude_score)
             
             # Combine scores using weights
             # First combine stability and diversification with their weights
@@ -68,18 +69,18 @@ class EnhancedEQSCalculator:
             elif pd.notna(diversification_score):
                 quality_score = diversification_score  # Only diversification data available
             else:
-                logger.warning(f"Insufficient data to calculate EQS for {protocol_name}")
+                logger.warning("Insufficient data to calculate EQS for %s", protocol_name)
                 return None
                 
             # Apply magnitude adjustment - this scales the quality score based on revenue magnitude
             # Using the formula from your description: (stability_score * magnitude_score) / 100
             adjusted_score = (quality_score * magnitude_score) / 100
             
-            logger.info(f"Calculated EQS for {protocol_name}: {adjusted_score:.2f}")
+            logger.info("Calculated EQS for %s: %.2f", protocol_name, adjusted_score)
             return round(adjusted_score, 2)
             
         except Exception as e:
-            logger.error(f"Error calculating EQS for {protocol_name}: {str(e)}")
+            logger.error("Error calculating EQS for %s: %s", protocol_name, e)
             return None
             
     def _calculate_stability_score(self, df: pd.DataFrame) -> float:
@@ -134,12 +135,9 @@ class EnhancedEQSCalculator:
         if total_revenue <= 0:
             return 10.0  # Minimum score instead of zero
             
-        # Use a reference value for "large revenue" based on industry standards
-        # This could be adjusted based on protocol category
-        reference_revenue = 5000000  # $5M monthly revenue as a reference point
-        
-        # Using logarithmic scaling: magnitude_score = 100 * log(revenue_sum + 1) / log(max_revenue_sum + 1)
-        magnitude_score = 100 * np.log(total_revenue + 1) / np.log(reference_revenue + 1)
+        # Using logarithmic scaling against a $5M monthly reference revenue:
+        # magnitude_score = 100 * log(revenue_sum + 1) / log(max_revenue_sum + 1)
+        magnitude_score = 100 * np.log(total_revenue + 1) / LOG_REFERENCE_REVENUE
         
         # Ensure score is within 0-100 range
         return min(100, max(0, magnitude_score))
@@ -165,8 +163,8 @@ class EnhancedEQSCalculator:
             logger.warning("Insufficient source diversity for diversification calculation")
             return 0.0  # Minimum diversification
             
-        # Get revenue by source
-        revenue_by_source = recent_data.groupby('source')['total_fees'].sum()
+        # Get revenue by source (observed=True keeps unused categorical sources out of the stats)
+        revenue_by_source = recent_data.groupby('source', observed=True)['total_fees'].sum()
         
         # Calculate standard deviation and mean for diversification
         diversification_std = revenue_by_source.std()
@@ -200,7 +198,7 @@ def integrate_with_dune_processor(processor, protocol_name: str, data: Dict[str,
         EQS score (0-100) or None if insufficient data
     """
     if 'eqs' not in data or data['eqs'].empty:
-        logger.warning(f"No EQS data available for {protocol_name}")
+        logger.warning("No EQS data available for %s", protocol_name)
         return None
         
     try:
@@ -209,23 +207,24 @@ def integrate_with_dune_processor(processor, protocol_name: str, data: Dict[str,
         
         # Log detailed information about the calculation
         if eqs_score is not None:
-            logger.info(f"Successfully calculated EQS for {protocol_name}: {eqs_score:.2f}")
-            
-            # Save detailed component scores for reference
-            # This could be expanded to store these in the database
-            stability_score = calculator._calculate_stability_score(data['eqs'])
-            diversification_score = calculator._calculate_diversification_score(data['eqs'])
-            magnitude_score = calculator._calculate_magnitude_score(data['eqs'])
+            logger.info("Successfully calculated EQS for %s: %.2f", protocol_name, eqs_score)
             
-            logger.info(f"{protocol_name} component scores - "
-                       f"Stability: {stability_score:.2f}, "
-                       f"Diversification: {diversification_score:.2f}, "
-                       f"Magnitude: {magnitude_score:.2f}")
+            # Component scores are only needed for the log, so skip them when INFO is disabled
+            if logger.isEnabledFor(logging.INFO):
+                # Save detailed component scores for reference
+                # This could be expanded to store these in the database
+                components = calculate_eqs_components({protocol_name: data['eqs']})[protocol_name]
+                
+                logger.info("%s component scores - Stability: %.2f, Diversification: %.2f, Magnitude: %.2f",
+                            protocol_name,
+                            components['stability'],
+                            components['diversification'],
+                            components['magnitude'])
         
         return eqs_score
         
     except Exception as e:
-        logger.error(f"Error in EQS calculation for {protocol_name}: {str(e)}")
+        logger.error("Error in EQS calculation for %s: %s", protocol_name, e)
         return None
 
 
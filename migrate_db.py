@@ -1,5 +1,6 @@
 """
-Database migration script to add new percentile columns to UserData model.
+Database migration script to add new percentile columns to UserData model
+and the composite indexes on the score and history tables.
 """
 import os
 import logging
@@ -10,6 +11,21 @@ from sqlalchemy.exc import SQLAlchemyError
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Composite indexes declared on the models; db.create_all() only adds them to new tables
+INDEX_STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS ix_score_protocol_timestamp ON score (protocol_id, timestamp DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_revenue_data_protocol_month ON revenue_data (protocol_id, month)",
+    "CREATE INDEX IF NOT EXISTS ix_user_data_protocol_month ON user_data (protocol_id, month)",
+]
+
+def create_indexes(engine):
+    """Create the composite indexes on existing tables"""
+    logger.info("Creating composite indexes")
+    with engine.connect() as conn:
+        for statement in INDEX_STATEMENTS:
+            conn.execute(text(statement))
+        conn.commit()
+
 def run_migrations():
     """Run database migrations to add new columns"""
     try:
@@ -31,9 +47,10 @@ def run_migrations():
             """))
             column_exists = result.scalar() is not None
         
-        # Skip if columns already exist
+        # Skip the column migration if columns already exist
         if column_exists:
-            logger.info("Columns already exist, skipping migration")
+            logger.info("Columns already exist, skipping column migration")
+            create_indexes(engine)
             return True
         
         # Add the new columns
@@ -47,6 +64,8 @@ def run_migrations():
             """))
             conn.commit()
         
+        create_indexes(engine)
+        
         logger.info("Database migration completed successfully")
         return True
         
@@ -1,4 +1,5 @@
 from datetime import datetime
+from sqlalchemy import Index
 from app import db
 
 class Protocol(db.Model):
@@ -33,6 +34,11 @@ class Score(db.Model):
     how3_score = db.Column(db.Float)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Serves the latest-score-per-protocol lookup as an index seek
+    __table_args__ = (
+        Index('ix_score_protocol_timestamp', 'protocol_id', timestamp.desc()),
+    )
+    
     def __repr__(self):
         return f"<Score {self.protocol_id}>"
 
@@ -46,6 +52,11 @@ class RevenueData(db.Model):
     stability_score = db.Column(db.Float)
     magnitude_score = db.Column(db.Float)
     
+    # Serves per-protocol history reads ordered by month
+    __table_args__ = (
+        Index('ix_revenue_data_protocol_month', 'protocol_id', 'month'),
+    )
+    
     def __repr__(self):
         return f"<RevenueData {self.protocol_id} {self.month}>"
 
@@ -65,6 +76,11 @@ class UserData(db.Model):
     transaction_count_percentile = db.Column(db.Float)
     transaction_volume_percentile = db.Column(db.Float)
     
+    # Serves per-protocol history reads ordered by month
+    __table_args__ = (
+        Index('ix_user_data_protocol_month', 'protocol_id', 'month'),
+    )
+    
     def __repr__(self):
         return f"<UserData {self.protocol_id} {self.month}>"
 
@@ -84,17 +84,22 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-def custom_chainlink_ugs_processor(raw_data):
+def custom_chainlink_ugs_processor(raw_data, query_type=None):
     """
     Custom processor for Chainlink UGS data to handle very large transaction volumes.
     
     Args:
         raw_data: Raw data from Dune query
+        query_type: Type of query data (passed by DuneProcessor, unused)
         
     Returns:
         Processed DataFrame
     """
     try:
+        # Unwrap the shared DataFrame from DuneProcessor.fetch_query_data results
+        if isinstance(raw_data, dict) and 'frame' in raw_data.get('result', {}):
+            raw_data = raw_data['result']['frame']
+        
         # Convert to DataFrame if not already
         if not isinstance(raw_data, pd.DataFrame):
             if 'rows' in raw_data:
@@ -108,10 +113,15 @@ def custom_chainlink_ugs_processor(raw_data):
                 logger.error("Expected 'rows' in raw_data but not found")
                 return pd.DataFrame()
         else:
-            df = raw_data.copy()
+            # Shallow view: column assignments below replace columns without touching the shared frame
+            df = raw_data.copy(deep=False)
         
         if df.empty:
             return df
+        
+        # Store the small fixed set of revenue sources as categorical codes
+        if 'source' in df.columns:
+            df['source'] = df['source'].astype('category')
             
         # Handle very large transaction volumes (divide by 10^18 if needed for token normalization)
         if 'transaction_volume' in df.columns:
@@ -120,6 +130,11 @@ def custom_chainlink_ugs_processor(raw_data):
                 logger.info("Normalizing large transaction volumes (dividing by 10^18)")
                 df['transaction_volume'] = df['transaction_volume'] / 1e18
         
+        # Monetary columns fit comfortably in float32 once normalized
+        for col in ('total_fees', 'transaction_volume'):
+            if col in df.columns:
+                df[col] = df[col].astype(np.float32, copy=False)
+        
         # Sort by month to ensure proper time-series handling
         if 'month' in df.columns:
             df = df.sort_values('month')
@@ -2,43 +2,36 @@
 Utility for building and validating Dune Analytics queries for different protocols.
 This helps generate SQL queries that can be run in Dune's interface to create dashboards.
 """
+import io
 import os
 import json
 import logging
-from typing import Dict, List, Any, Optional
+import sys
+import functools
+import mmap
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Callable, Dict, List, Any, Iterable, Iterator, Mapping, Optional, Tuple
+
+from query_templates import compile_template, normalize_where
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class DuneQueryBuilder:
-    """Helper class to build and validate Dune Analytics queries."""
-    
-    def __init__(self):
-        """Initialize the query builder."""
-        # Base templates for different query types
-        self.templates = {
-            'eqs': self._load_eqs_template(),
-            'ugs': self._load_ugs_template(),
-            'fvs': self._load_fvs_template()
-        }
-        
-        # Protocol-specific table mappings
-        self.protocol_tables = {}
-        
-        # Load protocol table configurations if available
-        config_path = 'protocol_tables.json'
-        if os.path.exists(config_path):
-            try:
-                with open(config_path, 'r') as f:
-                    self.protocol_tables = json.load(f)
-                logger.info(f"Loaded protocol tables from {config_path}")
-            except Exception as e:
-                logger.error(f"Error loading protocol tables: {str(e)}")
-    
-    def _load_eqs_template(self) -> str:
-        """Load template for Earnings Quality Score queries."""
-        return """
+# Config files larger than this are parsed straight from a memory map
+_MMAP_THRESHOLD = 1024 * 1024
+
+# Dune query parameter standing in for the lookback months, so one SQL text serves every value
+_MONTHS_PARAM = '{{months}}'
+
+# Base template for Earnings Quality Score queries
+_EQS_TEMPLATE = """
 WITH MonthlyFees AS (
   SELECT
     DATE_TRUNC('month', {timestamp_col}) AS month,
@@ -46,21 +39,28 @@ WITH MonthlyFees AS (
     '{source}' AS source
   FROM {protocol_schema}.{revenue_table}
   WHERE
-    {timestamp_col} >= CURRENT_DATE - INTERVAL '{months}' month
+    {timestamp_col} >= {months_clause}
     {additional_where}
   GROUP BY
     1
   {union_clauses}
+), WithLag AS (
+  SELECT
+    month,
+    total_fees,
+    source,
+    LAG(total_fees) OVER (PARTITION BY source ORDER BY month) AS previous_month_fees
+  FROM MonthlyFees
 ), RevenueStability AS (
   SELECT
     month,
     total_fees,
     source,
-    LAG(total_fees) OVER (PARTITION BY source ORDER BY month) AS previous_month_fees,
+    previous_month_fees,
     (
-      total_fees - LAG(total_fees) OVER (PARTITION BY source ORDER BY month)
-    ) / NULLIF(LAG(total_fees) OVER (PARTITION BY source ORDER BY month), 0) AS mom_change
-  FROM MonthlyFees
+      total_fees - previous_month_fees
+    ) / NULLIF(previous_month_fees, 0) AS mom_change
+  FROM WithLag
 ), StabilityMagnitudeScores AS (
   SELECT
     source,
@@ -86,56 +86,29 @@ ORDER BY
   month DESC,
   source
 """
-    
-    def _load_ugs_template(self) -> str:
-        """Load template for User Growth Score queries."""
-        return """
-WITH monthly_active_addresses AS (
-  SELECT
-    DATE_TRUNC('month', {timestamp_col}) AS month,
-    COUNT(DISTINCT {user_address_col}) AS active_addresses
-  FROM {protocol_schema}.{user_table}
-  WHERE
-    {timestamp_col} >= CURRENT_DATE - INTERVAL '{months}' month
-    {additional_where}
-  GROUP BY
-    1
-), transaction_count_volume AS (
-  SELECT
-    DATE_TRUNC('month', {timestamp_col}) AS month,
-    COUNT(*) AS transaction_count,
-    SUM({amount_col}) AS transaction_volume
-  FROM {protocol_schema}.{transaction_table}
-  WHERE
-    {timestamp_col} >= CURRENT_DATE - INTERVAL '{months}' month
-    {additional_where}
-  GROUP BY
-    1
+
+# Base template for User Growth Score queries
+_UGS_TEMPLATE = """
+WITH {monthly_metrics}
 ), growth_rates AS (
   SELECT
-    m1.month,
-    m1.active_addresses,
-    m2.active_addresses AS previous_active_addresses,
+    month,
+    active_addresses,
+    LAG(active_addresses) OVER (ORDER BY month) AS previous_active_addresses,
     (
-      m1.active_addresses - m2.active_addresses
-    ) / NULLIF(m2.active_addresses, 0) * 100 AS active_address_growth_rate,
-    t1.transaction_count,
-    t2.transaction_count AS previous_transaction_count,
+      active_addresses - LAG(active_addresses) OVER (ORDER BY month)
+    ) / NULLIF(LAG(active_addresses) OVER (ORDER BY month), 0) * 100 AS active_address_growth_rate,
+    transaction_count,
+    LAG(transaction_count) OVER (ORDER BY month) AS previous_transaction_count,
     (
-      t1.transaction_count - t2.transaction_count
-    ) / NULLIF(t2.transaction_count, 0) * 100 AS transaction_count_growth_rate,
-    t1.transaction_volume,
-    t2.transaction_volume AS previous_transaction_volume,
+      transaction_count - LAG(transaction_count) OVER (ORDER BY month)
+    ) / NULLIF(LAG(transaction_count) OVER (ORDER BY month), 0) * 100 AS transaction_count_growth_rate,
+    transaction_volume,
+    LAG(transaction_volume) OVER (ORDER BY month) AS previous_transaction_volume,
     (
-      t1.transaction_volume - t2.transaction_volume
-    ) / NULLIF(t2.transaction_volume, 0) * 100 AS transaction_volume_growth_rate
-  FROM monthly_active_addresses AS m1
-  LEFT JOIN monthly_active_addresses AS m2
-    ON m1.month = m2.month + INTERVAL '1' MONTH
-  LEFT JOIN transaction_count_volume AS t1
-    ON m1.month = t1.month
-  LEFT JOIN transaction_count_volume AS t2
-    ON t1.month = t2.month + INTERVAL '1' MONTH
+      transaction_volume - LAG(transaction_volume) OVER (ORDER BY month)
+    ) / NULLIF(LAG(transaction_volume) OVER (ORDER BY month), 0) * 100 AS transaction_volume_growth_rate
+  FROM monthly_metrics
 ), percentile_ranking AS (
   SELECT
     month,
@@ -165,10 +138,9 @@ FROM percentile_ranking
 ORDER BY
   month DESC
 """
-    
-    def _load_fvs_template(self) -> str:
-        """Load template for Fair Value Score queries."""
-        return """
+
+# Base template for Fair Value Score queries
+_FVS_TEMPLATE = """
 -- This is an example FVS query template
 -- You may need to customize this based on the specific metrics needed
 WITH monthly_metrics AS (
@@ -205,6 +177,346 @@ SELECT
 FROM
   monthly_metrics
 """
+
+
+# Generic column names, interned so every mapping shares the same string objects
+_DEFAULT_TIMESTAMP_COL = sys.intern('block_time')
+_DEFAULT_FEE_AMOUNT_COL = sys.intern('fee_usd')
+_DEFAULT_USER_ADDRESS_COL = sys.intern('user_address')
+_DEFAULT_AMOUNT_COL = sys.intern('amount_usd')
+_DEFAULT_MARKET_CAP_VALUE = sys.intern('0')
+
+# Single revenue source used when a mapping does not list any, shared and read-only
+_DEFAULT_REVENUE_SOURCES = (MappingProxyType({'name': 'total'}),)
+
+@functools.lru_cache(maxsize=64)
+def _default_table_names(protocol: str) -> Mapping[str, str]:
+    """Build the protocol-derived default table names once per protocol."""
+    return MappingProxyType({
+        'revenue_table': sys.intern(f'{protocol}_revenue'),
+        'user_table': sys.intern(f'{protocol}_users'),
+        'transaction_table': sys.intern(f'{protocol}_transactions')
+    })
+
+@dataclass(slots=True)
+class ResolvedSource:
+    """A revenue source with table defaults merged in from its protocol mapping."""
+    source: str
+    protocol_schema: str
+    revenue_table: str
+    timestamp_col: str
+    fee_amount_col: str
+    additional_where: str
+
+@dataclass(slots=True)
+class ResolvedConfig:
+    """A protocol table mapping with every field resolved against the generic defaults."""
+    protocol_schema: str
+    revenue_table: str
+    user_table: str
+    transaction_table: str
+    timestamp_col: str
+    fee_amount_col: str
+    user_address_col: str
+    amount_col: str
+    market_cap_value: str
+    additional_where: str
+    revenue_sources: List[ResolvedSource]
+
+def _resolve_tables(protocol: str, tables: Mapping[str, Any]) -> ResolvedConfig:
+    """
+    Merge a protocol's table mapping with the generic defaults once.
+    
+    Args:
+        protocol: Protocol name, used to derive default schema and table names
+        tables: Table mapping for the protocol
+        
+    Returns:
+        ResolvedConfig with normalized WHERE conditions and fully populated revenue sources
+    """
+    default_names = _default_table_names(protocol)
+    protocol_schema = tables.get('protocol_schema', protocol)
+    revenue_table = tables.get('revenue_table', default_names['revenue_table'])
+    timestamp_col = tables.get('timestamp_col', _DEFAULT_TIMESTAMP_COL)
+    fee_amount_col = tables.get('fee_amount_col', _DEFAULT_FEE_AMOUNT_COL)
+    default_where = tables.get('additional_where', '')
+    
+    # An empty source list still yields a main query built from the top-level mapping
+    raw_sources = tables.get('revenue_sources', _DEFAULT_REVENUE_SOURCES) or ({},)
+    revenue_sources = [
+        ResolvedSource(
+            source=source.get('name', f'source_{i}' if i else 'total'),
+            protocol_schema=source.get('schema', protocol_schema),
+            revenue_table=source.get('table', revenue_table),
+            timestamp_col=source.get('timestamp_col', timestamp_col),
+            fee_amount_col=source.get('fee_amount_col', fee_amount_col),
+            additional_where=normalize_where(source.get('additional_where', default_where))
+        )
+        for i, source in enumerate(raw_sources)
+    ]
+    
+    return ResolvedConfig(
+        protocol_schema=protocol_schema,
+        revenue_table=revenue_table,
+        user_table=tables.get('user_table', default_names['user_table']),
+        transaction_table=tables.get('transaction_table', default_names['transaction_table']),
+        timestamp_col=timestamp_col,
+        fee_amount_col=fee_amount_col,
+        user_address_col=tables.get('user_address_col', _DEFAULT_USER_ADDRESS_COL),
+        amount_col=tables.get('amount_col', _DEFAULT_AMOUNT_COL),
+        market_cap_value=tables.get('market_cap_value', _DEFAULT_MARKET_CAP_VALUE),
+        additional_where=normalize_where(default_where),
+        revenue_sources=revenue_sources
+    )
+
+@functools.lru_cache(maxsize=64)
+def _default_tables(protocol: str) -> Mapping[str, Any]:
+    """Build the generic table mappings for a protocol once and share a read-only view of them."""
+    return MappingProxyType({
+        'protocol_schema': protocol,
+        **_default_table_names(protocol),
+        'timestamp_col': _DEFAULT_TIMESTAMP_COL,
+        'fee_amount_col': _DEFAULT_FEE_AMOUNT_COL,
+        'user_address_col': _DEFAULT_USER_ADDRESS_COL,
+        'amount_col': _DEFAULT_AMOUNT_COL,
+        'market_cap_value': _DEFAULT_MARKET_CAP_VALUE,
+        'revenue_sources': _DEFAULT_REVENUE_SOURCES
+    })
+
+class ProtocolRegistry:
+    """
+    Column store of protocol table mappings.
+    
+    Each mapping field is kept in its own dict keyed by protocol, so bulk builds read one
+    field across many protocols without walking a nested dict per protocol. Full mappings
+    are rebuilt only when requested.
+    """
+    
+    def __init__(self, mappings: Optional[Mapping[str, Mapping[str, Any]]] = None):
+        """Initialize the registry, optionally from a dict of protocol mappings."""
+        self._columns: Dict[str, Dict[str, Any]] = {}
+        self._fields: Dict[str, Tuple[str, ...]] = {}
+        for protocol, tables in (mappings or {}).items():
+            self.add(protocol, tables)
+    
+    @property
+    def revenue_sources(self) -> Dict[str, Any]:
+        """Revenue source lists keyed by protocol."""
+        return self.column('revenue_sources')
+    
+    def column(self, field: str) -> Dict[str, Any]:
+        """Get the values of one mapping field keyed by protocol."""
+        return self._columns.get(field, {})
+    
+    def add(self, protocol: str, tables: Mapping[str, Any]):
+        """Split a protocol mapping into the column stores, replacing any previous mapping."""
+        self.remove(protocol)
+        for field, value in tables.items():
+            self._columns.setdefault(field, {})[protocol] = value
+        self._fields[protocol] = tuple(tables)
+    
+    def remove(self, protocol: str):
+        """Drop a protocol's mapping if present."""
+        for field in self._fields.pop(protocol, ()):
+            del self._columns[field][protocol]
+    
+    def get(self, protocol: str, default: Any = None) -> Any:
+        """Rebuild the mapping for a protocol, or return default if it is not registered."""
+        fields = self._fields.get(protocol)
+        if fields is None:
+            return default
+        return {field: self._columns[field][protocol] for field in fields}
+    
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        """Rebuild all mappings as a dict of dicts."""
+        return {protocol: self.get(protocol) for protocol in self._fields}
+    
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Iterate over (protocol, mapping) pairs."""
+        for protocol in self._fields:
+            yield protocol, self.get(protocol)
+    
+    def __contains__(self, protocol: object) -> bool:
+        return protocol in self._fields
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fields)
+    
+    def __len__(self) -> int:
+        return len(self._fields)
+
+class SqlTemplateCache:
+    """Cache of finished SQL strings keyed by the inputs that produced them."""
+    
+    def __init__(self):
+        """Initialize an empty cache."""
+        self._entries: Dict[Tuple, str] = {}
+    
+    def register(self, key: Tuple, sql: str) -> str:
+        """Store the SQL for a key and return it."""
+        self._entries[key] = sql
+        return sql
+    
+    def get(self, key: Tuple) -> Optional[str]:
+        """Get the cached SQL for a key, or None if it has not been built yet."""
+        return self._entries.get(key)
+    
+    def clear(self):
+        """Drop all cached SQL."""
+        self._entries.clear()
+
+class DuneQueryBuilder:
+    """Helper class to build and validate Dune Analytics queries."""
+    
+    # UNION ALL clause appended to the EQS MonthlyFees CTE for each extra revenue source
+    _UNION_TPL = """
+  UNION ALL
+  SELECT
+    DATE_TRUNC('month', {timestamp_col}) AS month,
+    SUM({fee_amount_col}) AS total_fees,
+    '{source}' AS source
+  FROM {protocol_schema}.{revenue_table}
+  WHERE
+    {timestamp_col} >= {months_clause}
+    {additional_where}
+  GROUP BY
+    1"""
+    
+    # Per-month UGS metrics when users and transactions come from the same table: one scan
+    _UGS_FUSED_METRICS_TPL = """monthly_metrics AS (
+  SELECT
+    DATE_TRUNC('month', {timestamp_col}) AS month,
+    COUNT(DISTINCT {user_address_col}) AS active_addresses,
+    COUNT(*) AS transaction_count,
+    SUM({amount_col}) AS transaction_volume
+  FROM {protocol_schema}.{user_table}
+  WHERE
+    {timestamp_col} >= {months_clause}
+    {additional_where}
+  GROUP BY
+    1"""
+    
+    # Per-month UGS metrics from separate user and transaction tables, joined on month
+    _UGS_SPLIT_METRICS_TPL = """monthly_active_addresses AS (
+  SELECT
+    DATE_TRUNC('month', {timestamp_col}) AS month,
+    COUNT(DISTINCT {user_address_col}) AS active_addresses
+  FROM {protocol_schema}.{user_table}
+  WHERE
+    {timestamp_col} >= {months_clause}
+    {additional_where}
+  GROUP BY
+    1
+), transaction_count_volume AS (
+  SELECT
+    DATE_TRUNC('month', {timestamp_col}) AS month,
+    COUNT(*) AS transaction_count,
+    SUM({amount_col}) AS transaction_volume
+  FROM {protocol_schema}.{transaction_table}
+  WHERE
+    {timestamp_col} >= {months_clause}
+    {additional_where}
+  GROUP BY
+    1
+), monthly_metrics AS (
+  SELECT
+    a.month,
+    a.active_addresses,
+    t.transaction_count,
+    t.transaction_volume
+  FROM monthly_active_addresses AS a
+  LEFT JOIN transaction_count_volume AS t
+    ON a.month = t.month"""
+    
+    # Template placeholders filled from the resolved config (or the main revenue source for EQS),
+    # in addition to months_clause, the EQS union_clauses and the UGS monthly_metrics
+    _PARAM_SPEC = {
+        'eqs': ('protocol_schema', 'revenue_table', 'timestamp_col', 'fee_amount_col', 'source',
+                'additional_where'),
+        'ugs': ('protocol_schema', 'user_table', 'transaction_table', 'timestamp_col',
+                'user_address_col', 'amount_col', 'additional_where'),
+        'fvs': ('protocol_schema', 'revenue_table', 'timestamp_col', 'fee_amount_col',
+                'market_cap_value', 'additional_where')
+    }
+    
+    def __init__(self):
+        """Initialize the query builder."""
+        # Base templates for different query types, loaded on first use
+        self.templates: Dict[str, str] = {}
+        
+        # Compiled render functions per query type, so templates are only parsed once
+        self._renderers: Dict[str, Callable[..., str]] = {}
+        self._render_union = compile_template(self._UNION_TPL)
+        self._render_ugs_metrics = {
+            True: compile_template(self._UGS_FUSED_METRICS_TPL),
+            False: compile_template(self._UGS_SPLIT_METRICS_TPL)
+        }
+        
+        # Rendered lookback interval per number of months
+        self._months_frag: Dict[Optional[int], str] = {}
+        
+        # Protocol-specific table mappings
+        self.protocol_tables = ProtocolRegistry()
+        
+        # Mappings merged with defaults per protocol, computed when mappings are registered
+        self._resolved: Dict[str, ResolvedConfig] = {}
+        
+        # Finished queries keyed by (protocol, query_type, months); None months are parameterized queries
+        self._query_cache = SqlTemplateCache()
+        
+        # Load protocol table configurations if available
+        config_path = 'protocol_tables.json'
+        try:
+            with open(config_path, 'rb') as f:
+                self.protocol_tables = ProtocolRegistry(self._parse_protocol_tables(f))
+            self._resolved = {
+                protocol: _resolve_tables(protocol, tables)
+                for protocol, tables in self.protocol_tables.items()
+            }
+            logger.info("Loaded protocol tables from %s", config_path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error("Error loading protocol tables: %s", e)
+    
+    @staticmethod
+    def _parse_protocol_tables(f) -> Dict[str, Any]:
+        """Parse protocol table mappings from a binary file, using orjson when available."""
+        if orjson is None:
+            return json.loads(f.read())
+        
+        if os.fstat(f.fileno()).st_size > _MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                return orjson.loads(view)
+        return orjson.loads(f.read())
+    
+    def _load_eqs_template(self) -> str:
+        """Load template for Earnings Quality Score queries."""
+        return _EQS_TEMPLATE
+    
+    def _load_ugs_template(self) -> str:
+        """Load template for User Growth Score queries."""
+        return _UGS_TEMPLATE
+    
+    def _load_fvs_template(self) -> str:
+        """Load template for Fair Value Score queries."""
+        return _FVS_TEMPLATE
+    
+    # Template loaders by query type; templates are only loaded when first requested
+    _LOADERS = {
+        'eqs': _load_eqs_template,
+        'ugs': _load_ugs_template,
+        'fvs': _load_fvs_template
+    }
+    
+    def _get_renderer(self, query_type: str) -> Callable[..., str]:
+        """Get the render function for a query type, loading and compiling its template on first use."""
+        renderer = self._renderers.get(query_type)
+        if renderer is None:
+            template = self.templates.get(query_type) or self.templates.setdefault(
+                query_type, self._LOADERS[query_type](self))
+            renderer = self._renderers.setdefault(query_type, compile_template(template))
+        return renderer
     
     def build_query(self, protocol: str, query_type: str, months: int = 12) -> str:
         """
@@ -218,178 +530,184 @@ FROM
         Returns:
             SQL query string for Dune Analytics
         """
-        if query_type not in self.templates:
-            raise ValueError(f"Unknown query type: {query_type}")
+        return self._build_cached(protocol, query_type, months)
+    
+    def build_parameterized_query(self, protocol: str, query_type: str,
+                                  months: int = 12) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build a query that takes the lookback months as a Dune query parameter.
         
-        # Get protocol-specific table mappings
-        if protocol not in self.protocol_tables:
-            logger.warning(f"No table mapping found for {protocol}. Using generic placeholders.")
-            tables = self._get_default_tables(protocol)
-        else:
-            tables = self.protocol_tables[protocol]
+        The SQL text is the same for every months value, so Dune can reuse its cached results.
         
-        # Apply protocol-specific table mappings to template
-        template = self.templates[query_type]
+        Args:
+            protocol: Protocol name (e.g., 'chainlink')
+            query_type: Type of query ('eqs', 'ugs', 'fvs')
+            months: Number of months of data to retrieve
+            
+        Returns:
+            Tuple of (SQL query string, query parameters dictionary)
+        """
+        query = self._build_cached(protocol, query_type, None)
+        # FVS always looks back 12 months and takes no parameter
+        params = {'months': months} if _MONTHS_PARAM in query else {}
+        return query, params
+    
+    def build_query_batch(self, protocols: Iterable[str], query_type: str, months: int = 12) -> Iterator[str]:
+        """
+        Build queries of one type for many protocols.
         
-        if query_type == 'eqs':
-            return self._build_eqs_query(protocol, template, tables, months)
-        elif query_type == 'ugs':
-            return self._build_ugs_query(protocol, template, tables, months)
-        elif query_type == 'fvs':
-            return self._build_fvs_query(protocol, template, tables, months)
-        else:
+        The render function and placeholder spec are looked up once for the whole batch.
+        
+        Args:
+            protocols: Protocol names
+            query_type: Type of query ('eqs', 'ugs', 'fvs')
+            months: Number of months of data to retrieve
+            
+        Yields:
+            SQL query string for each protocol, in order
+        """
+        if query_type not in self._LOADERS:
             raise ValueError(f"Unknown query type: {query_type}")
+        
+        render = self._get_renderer(query_type)
+        param_names = self._PARAM_SPEC[query_type]
+        
+        for protocol in protocols:
+            cache_key = (protocol, query_type, months)
+            query = self._query_cache.get(cache_key)
+            if query is None:
+                query = self._query_cache.register(
+                    cache_key, self._build(query_type, self._get_resolved(protocol), months, render, param_names))
+            yield query
     
-    def _build_eqs_query(self, protocol: str, template: str, tables: Dict[str, Any], months: int) -> str:
-        """Build an EQS query using the template and protocol-specific tables."""
-        # Extract table config for EQS
-        revenue_sources = tables.get('revenue_sources', [{'name': 'total'}])
+    def _build_cached(self, protocol: str, query_type: str, months: Optional[int]) -> str:
+        """
+        Build a query for a specific protocol and type, reusing previously built SQL.
         
-        # Create UNION ALL clauses for multiple revenue sources
-        union_clauses = []
-        for i, source in enumerate(revenue_sources[1:], 1):  # Skip first source (included in main query)
-            source_name = source.get('name', f'source_{i}')
-            source_table = source.get('table', tables.get('revenue_table', f'{protocol}_revenue'))
-            source_schema = source.get('schema', tables.get('protocol_schema', protocol))
-            timestamp_col = source.get('timestamp_col', tables.get('timestamp_col', 'block_time'))
-            fee_amount_col = source.get('fee_amount_col', tables.get('fee_amount_col', 'fee_usd'))
-            additional_where = source.get('additional_where', tables.get('additional_where', ''))
-            
-            # Format the additional WHERE clause if present
-            if additional_where and not additional_where.strip().startswith('AND'):
-                additional_where = f"AND {additional_where}"
+        Args:
+            protocol: Protocol name (e.g., 'chainlink')
+            query_type: Type of query ('eqs', 'ugs', 'fvs')
+            months: Number of months of data to retrieve, or None to leave it as the
+                {{months}} Dune query parameter
             
-            union_clause = f"""
-  UNION ALL
-  SELECT
-    DATE_TRUNC('month', {timestamp_col}) AS month,
-    SUM({fee_amount_col}) AS total_fees,
-    '{source_name}' AS source
-  FROM {source_schema}.{source_table}
-  WHERE
-    {timestamp_col} >= CURRENT_DATE - INTERVAL '{months}' month
-    {additional_where}
-  GROUP BY
-    1"""
-            union_clauses.append(union_clause)
-        
-        # Get default values for main query
-        main_source = revenue_sources[0] if revenue_sources else {}
-        source_name = main_source.get('name', 'total')
-        revenue_table = main_source.get('table', tables.get('revenue_table', f'{protocol}_revenue'))
-        protocol_schema = main_source.get('schema', tables.get('protocol_schema', protocol))
-        timestamp_col = main_source.get('timestamp_col', tables.get('timestamp_col', 'block_time'))
-        fee_amount_col = main_source.get('fee_amount_col', tables.get('fee_amount_col', 'fee_usd'))
-        additional_where = main_source.get('additional_where', tables.get('additional_where', ''))
+        Returns:
+            SQL query string for Dune Analytics
+        """
+        if query_type not in self._LOADERS:
+            raise ValueError(f"Unknown query type: {query_type}")
         
-        # Format the additional WHERE clause if present
-        if additional_where and not additional_where.strip().startswith('AND'):
-            additional_where = f"AND {additional_where}"
+        # Output is deterministic for given inputs, so reuse previously built SQL
+        cache_key = (protocol, query_type, months)
+        cached_query = self._query_cache.get(cache_key)
+        if cached_query is not None:
+            return cached_query
         
-        # Build the query by substituting values
-        query = template.format(
-            protocol_schema=protocol_schema,
-            revenue_table=revenue_table,
-            timestamp_col=timestamp_col,
-            fee_amount_col=fee_amount_col,
-            source=source_name,
-            months=months,
-            additional_where=additional_where,
-            union_clauses=''.join(union_clauses)
-        )
+        # Get protocol-specific table mappings, resolved against the defaults
+        cfg = self._get_resolved(protocol)
         
-        return query
-    
-    def _build_ugs_query(self, protocol: str, template: str, tables: Dict[str, Any], months: int) -> str:
-        """Build a UGS query using the template and protocol-specific tables."""
-        # Extract table config for UGS
-        protocol_schema = tables.get('protocol_schema', protocol)
-        user_table = tables.get('user_table', f'{protocol}_users')
-        transaction_table = tables.get('transaction_table', f'{protocol}_transactions')
-        timestamp_col = tables.get('timestamp_col', 'block_time')
-        user_address_col = tables.get('user_address_col', 'user_address')
-        amount_col = tables.get('amount_col', 'amount_usd')
-        additional_where = tables.get('additional_where', '')
+        # Apply protocol-specific table mappings to template
+        return self._query_cache.register(cache_key, self._build(query_type, cfg, months))
+    
+    def _get_resolved(self, protocol: str) -> ResolvedConfig:
+        """Get the resolved table mapping for a protocol, falling back to generic defaults."""
+        if protocol not in self.protocol_tables:
+            logger.warning("No table mapping found for %s. Using generic placeholders.", protocol)
+        cfg = self._resolved.get(protocol)
+        if cfg is None:
+            cfg = self._resolved[protocol] = _resolve_tables(protocol, self.get_protocol_tables(protocol))
+        return cfg
+    
+    def _build(self, query_type: str, cfg: ResolvedConfig, months: Optional[int],
+               render: Optional[Callable[..., str]] = None,
+               param_names: Optional[Tuple[str, ...]] = None) -> str:
+        """
+        Build a query of any type from its template and the resolved protocol tables.
         
-        # Format the additional WHERE clause if present
-        if additional_where and not additional_where.strip().startswith('AND'):
-            additional_where = f"AND {additional_where}"
+        Args:
+            query_type: Type of query ('eqs', 'ugs', 'fvs')
+            cfg: Resolved table mapping for the protocol
+            months: Number of months of data to retrieve, or None for the {{months}} parameter
+            render: Render function for the query type, looked up if not given
+            param_names: Placeholders filled from the config, looked up if not given
+            
+        Returns:
+            SQL query string for Dune Analytics
+        """
+        if render is None:
+            render = self._get_renderer(query_type)
+        if param_names is None:
+            param_names = self._PARAM_SPEC[query_type]
         
-        # Build the query by substituting values
-        query = template.format(
-            protocol_schema=protocol_schema,
-            user_table=user_table,
-            transaction_table=transaction_table,
-            timestamp_col=timestamp_col,
-            user_address_col=user_address_col,
-            amount_col=amount_col,
-            months=months,
-            additional_where=additional_where
-        )
+        months_clause = self._months_frag.get(months)
+        if months_clause is None:
+            interval = _MONTHS_PARAM if months is None else months
+            months_clause = self._months_frag.setdefault(months, f"CURRENT_DATE - INTERVAL '{interval}' month")
         
-        return query
-    
-    def _build_fvs_query(self, protocol: str, template: str, tables: Dict[str, Any], months: int) -> str:
-        """Build an FVS query using the template and protocol-specific tables."""
-        # Extract table config for FVS
-        protocol_schema = tables.get('protocol_schema', protocol)
-        revenue_table = tables.get('revenue_table', f'{protocol}_revenue')
-        timestamp_col = tables.get('timestamp_col', 'block_time')
-        fee_amount_col = tables.get('fee_amount_col', 'fee_usd')
-        market_cap_value = tables.get('market_cap_value', '0')
-        additional_where = tables.get('additional_where', '')
+        params = {'months_clause': months_clause}
+        values = cfg
         
-        # Format the additional WHERE clause if present
-        if additional_where and not additional_where.strip().startswith('AND'):
-            additional_where = f"AND {additional_where}"
+        if query_type == 'eqs':
+            # The first revenue source fills the main query; the rest become UNION ALL clauses
+            values = cfg.revenue_sources[0]
+            union_buf = io.StringIO()
+            for source in cfg.revenue_sources[1:]:
+                union_buf.write(self._render_union(
+                    months_clause=months_clause,
+                    **{name: getattr(source, name) for name in param_names}
+                ))
+            params['union_clauses'] = union_buf.getvalue()
+        elif query_type == 'ugs':
+            # Users and transactions sharing a table are aggregated in a single scan
+            render_metrics = self._render_ugs_metrics[cfg.user_table == cfg.transaction_table]
+            params['monthly_metrics'] = render_metrics(
+                months_clause=months_clause,
+                **{name: getattr(cfg, name) for name in param_names}
+            )
         
-        # Build the query by substituting values
-        query = template.format(
-            protocol_schema=protocol_schema,
-            revenue_table=revenue_table,
-            timestamp_col=timestamp_col,
-            fee_amount_col=fee_amount_col,
-            market_cap_value=market_cap_value,
-            months=months,
-            additional_where=additional_where
-        )
+        for name in param_names:
+            params[name] = getattr(values, name)
         
-        return query
+        return render(**params)
     
-    def _get_default_tables(self, protocol: str) -> Dict[str, Any]:
+    def _get_default_tables(self, protocol: str) -> Mapping[str, Any]:
         """Get default table mappings for a protocol."""
-        return {
-            'protocol_schema': protocol,
-            'revenue_table': f'{protocol}_revenue',
-            'user_table': f'{protocol}_users',
-            'transaction_table': f'{protocol}_transactions',
-            'timestamp_col': 'block_time',
-            'fee_amount_col': 'fee_usd',
-            'user_address_col': 'user_address',
-            'amount_col': 'amount_usd',
-            'market_cap_value': '0',
-            'revenue_sources': [{'name': 'total'}]
-        }
+        return _default_tables(protocol)
     
     def save_protocol_tables(self, filepath: str = 'protocol_tables.json'):
         """Save the current protocol table mappings to a file."""
+        tmp_path = f"{filepath}.tmp"
         try:
-            with open(filepath, 'w') as f:
-                json.dump(self.protocol_tables, f, indent=2)
-            logger.info(f"Saved protocol table mappings to {filepath}")
+            # Serialize in memory, write with a single call, then swap the file into place
+            mappings = self.protocol_tables.to_dict()
+            if orjson is not None:
+                payload = orjson.dumps(mappings, option=orjson.OPT_INDENT_2)
+            else:
+                payload = json.dumps(mappings, indent=2).encode('utf-8')
+            with open(tmp_path, 'wb', buffering=0) as f:
+                f.write(payload)
+            os.replace(tmp_path, filepath)
+            logger.info("Saved protocol table mappings to %s", filepath)
             return True
         except Exception as e:
-            logger.error(f"Error saving protocol table mappings: {str(e)}")
+            logger.error("Error saving protocol table mappings: %s", e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             return False
     
     def add_protocol_tables(self, protocol: str, tables: Dict[str, Any]):
         """Add or update table mappings for a protocol."""
-        self.protocol_tables[protocol] = tables
-        logger.info(f"Added table mappings for {protocol}")
+        self.protocol_tables.add(protocol, tables)
+        self._resolved[protocol] = _resolve_tables(protocol, tables)
+        # Mappings changed, so previously built queries may be stale
+        self._query_cache.clear()
+        logger.info("Added table mappings for %s", protocol)
     
-    def get_protocol_tables(self, protocol: str) -> Dict[str, Any]:
+    def get_protocol_tables(self, protocol: str) -> Mapping[str, Any]:
         """Get table mappings for a specific protocol."""
-        return self.protocol_tables.get(protocol, self._get_default_tables(protocol))
+        tables = self.protocol_tables.get(protocol)
+        if tables is None:
+            tables = self._get_default_tables(protocol)
+        return tables
 
 
 if __name__ == "__main__":
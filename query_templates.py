@@ -2,14 +2,249 @@
 Standard query templates for different protocol metrics.
 These templates can be customized per protocol using placeholders.
 """
+import functools
+import io
 import json
 import os
 import logging
+import re
+import string
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
-# Template for Earnings Quality Score (EQS) queries
-EQS_TEMPLATE = """
+# Parsed protocol_tables.json, reloaded only when the file's modification time changes
+_PROTOCOL_TABLES_CACHE = None
+_PROTOCOL_TABLES_MTIME = None
+_PROTOCOL_TABLES_LOCK = threading.Lock()
+
+# Count active addresses with Trino's HyperLogLog-based approx_distinct (2.3% standard error)
+# instead of an exact COUNT(DISTINCT ...), which is much cheaper on large transfer tables
+USE_APPROX_DISTINCT = True
+
+def _distinct_count(column, approx=True):
+    """Get the SQL expression counting distinct values of a column, approximately or exactly."""
+    if approx:
+        return f"approx_distinct({column})"
+    return f"COUNT(DISTINCT {column})"
+
+# Rank each metric in its own subquery joined back on month instead of evaluating three
+# PERCENT_RANK windows in one SELECT; which form plans better depends on the engine
+USE_INLINE_PERCENT_RANK = False
+
+# Metric column and output alias of each percentile in the percentile_ranking CTE
+_PERCENT_RANK_METRICS = (
+    ('active_addresses', 'active_address_percentile'),
+    ('transaction_count', 'transaction_count_percentile'),
+    ('transaction_volume', 'transaction_volume_percentile'),
+)
+
+_PERCENTILE_RANKING_SELECT = """SELECT
+  month,
+  active_addresses,
+  transaction_count,
+  transaction_volume,
+  active_address_growth_rate,
+  transaction_count_growth_rate,
+  transaction_volume_growth_rate,
+  {rank_columns}
+FROM growth_rates""".format(
+    rank_columns=",\n  ".join(
+        f"PERCENT_RANK() OVER (ORDER BY {column}) AS {alias}" for column, alias in _PERCENT_RANK_METRICS
+    )
+)
+
+_INLINE_PERCENTILE_RANKING_SELECT = """SELECT
+  g.month,
+  g.active_addresses,
+  g.transaction_count,
+  g.transaction_volume,
+  g.active_address_growth_rate,
+  g.transaction_count_growth_rate,
+  g.transaction_volume_growth_rate,
+  {rank_columns}
+FROM growth_rates g
+{rank_joins}""".format(
+    rank_columns=",\n  ".join(
+        f"r{i}.pct AS {alias}" for i, (_, alias) in enumerate(_PERCENT_RANK_METRICS)
+    ),
+    rank_joins="\n".join(
+        f"JOIN (SELECT month, PERCENT_RANK() OVER (ORDER BY {column}) AS pct FROM growth_rates) r{i}"
+        f" ON r{i}.month = g.month"
+        for i, (column, _) in enumerate(_PERCENT_RANK_METRICS)
+    ),
+)
+
+def _percentile_ranking_select():
+    """Get the body of the percentile_ranking CTE, honoring USE_INLINE_PERCENT_RANK."""
+    if USE_INLINE_PERCENT_RANK:
+        return _INLINE_PERCENTILE_RANKING_SELECT
+    return _PERCENTILE_RANKING_SELECT
+
+# Dune query parameter substituted for the lookback months in parameterized queries
+MONTHS_PARAM = '{{months}}'
+
+# Dune query parameter substituted for the row limit in parameterized queries
+LIMIT_PARAM = '{{limit}}'
+
+def _check_limit(limit):
+    """Raise ValueError for a row limit too small to leave a previous month for growth rates."""
+    if limit != LIMIT_PARAM and int(limit) < 2:
+        raise ValueError(f"limit must be at least 2, got {limit}")
+
+def _apply_limit(query, limit):
+    """
+    Keep only the first rows of a query's ordered result, so Dune can use a TopN instead of a full sort.
+    
+    Args:
+        query: SQL query string ending in its final ORDER BY
+        limit: Number of rows to keep (at least 2, so growth rates have a previous month), LIMIT_PARAM, or None
+        
+    Returns:
+        SQL query string with a FETCH FIRST clause if a limit is given
+    """
+    if limit is None:
+        return query
+    _check_limit(limit)
+    return f"{query}\nFETCH FIRST {limit} ROWS ONLY"
+
+# Identifiers that can be used in SQL without quoting
+_PLAIN_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+def quote_identifier(name):
+    """
+    Make a schema or table name safe to interpolate into SQL.
+    
+    Plain identifiers are returned unchanged; anything else is wrapped in double quotes with
+    embedded double quotes escaped, so it cannot break out of the identifier position.
+    
+    Args:
+        name: Schema or table name
+        
+    Returns:
+        SQL identifier string
+    """
+    name = str(name)
+    if _PLAIN_IDENTIFIER.match(name):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+# Config fields holding schema, table or column names, quoted once when the config is loaded
+_IDENTIFIER_FIELDS = (
+    'protocol_schema', 'revenue_table', 'user_table', 'transaction_table', 'schema', 'table',
+    'timestamp_col', 'fee_amount_col', 'user_address_col', 'amount_col', 'partition_col',
+    'month_col', 'source_col'
+)
+
+def _quote_identifier_fields(entry):
+    """Quote every identifier-typed field of a config entry in place."""
+    for field in _IDENTIFIER_FIELDS:
+        if field in entry:
+            entry[field] = quote_identifier(entry[field])
+
+# Matches a condition that already begins with an AND keyword, in any case
+_LEADING_AND = re.compile(r'^\s*AND\b', re.IGNORECASE)
+
+def normalize_where(clause):
+    """Prefix an additional WHERE condition with AND unless it is empty or already starts with one."""
+    if not clause:
+        return ''
+    if _LEADING_AND.match(clause) is not None:
+        return clause
+    return f"AND {clause}"
+
+# Lower bound on a table's date partition column matching the block time window, so Dune can
+# prune partitions; added for tables whose config names a partition_col (e.g. block_date)
+_PARTITION_FILTER = "{partition_col} >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '{months}' month)"
+
+def _partition_filter(entry, months):
+    """Get the AND-prefixed partition predicate for a config entry, or '' if it has no partition_col."""
+    partition_col = entry.get('partition_col')
+    if not partition_col:
+        return ''
+    return 'AND ' + _PARTITION_FILTER.format(partition_col=partition_col, months=months)
+
+def _prepare_protocol_tables(all_protocol_data):
+    """
+    Prepare parsed protocol configurations for query generation.
+    
+    Protocol names are lowercased, every additional_where condition is normalized, identifier
+    fields are quoted and source names are escaped for use in string literals, so the query
+    functions can use the values as they are.
+    
+    Args:
+        all_protocol_data: Dictionary of protocol configurations as parsed from JSON
+        
+    Returns:
+        Dictionary of prepared protocol configurations keyed by lowercase protocol name
+    """
+    prepared = {}
+    for protocol, protocol_data in all_protocol_data.items():
+        if 'additional_where' in protocol_data:
+            protocol_data['additional_where'] = normalize_where(protocol_data['additional_where'])
+        _quote_identifier_fields(protocol_data)
+        for source in protocol_data.get('revenue_sources', []):
+            if 'additional_where' in source:
+                source['additional_where'] = normalize_where(source['additional_where'])
+            if 'name' in source:
+                source['name'] = str(source['name']).replace("'", "''")
+            _quote_identifier_fields(source)
+        for chain in protocol_data.get('user_addresses', []):
+            _quote_identifier_fields(chain)
+        if 'revenue_rollup' in protocol_data:
+            _quote_identifier_fields(protocol_data['revenue_rollup'])
+        prepared[protocol.lower()] = protocol_data
+    return prepared
+
+def _load_protocol_tables(path="protocol_tables.json"):
+    """
+    Load protocol table configurations, reusing the parsed file until it changes on disk.
+    
+    Args:
+        path: Path to the protocol tables JSON file
+        
+    Returns:
+        Dictionary of prepared protocol configurations (empty if the file does not exist)
+    """
+    global _PROTOCOL_TABLES_CACHE, _PROTOCOL_TABLES_MTIME
+    
+    try:
+        # Keyed on the absolute path too, so a change of working directory is not mistaken for a hit
+        mtime = (os.path.abspath(path), os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return {}
+    
+    with _PROTOCOL_TABLES_LOCK:
+        if _PROTOCOL_TABLES_CACHE is None or _PROTOCOL_TABLES_MTIME != mtime:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+            _PROTOCOL_TABLES_CACHE = _prepare_protocol_tables(data)
+            _PROTOCOL_TABLES_MTIME = mtime
+        return _PROTOCOL_TABLES_CACHE
+
+def _compact_sql(sql):
+    """
+    Strip indentation, trailing whitespace and blank lines from SQL to shrink the payload sent to Dune.
+    
+    Line breaks are kept so that -- comments still end where they did.
+    
+    Args:
+        sql: SQL text
+        
+    Returns:
+        Compacted SQL text
+    """
+    return '\n'.join(line.strip() for line in sql.splitlines() if line.strip())
+
+# Template for Earnings Quality Score (EQS) queries: the MonthlyFees CTE, followed by the
+# stability analysis shared with roll-up table queries
+_EQS_MONTHLY_FEES = """
 WITH MonthlyFees AS (
   SELECT
     DATE_TRUNC('month', {timestamp_col}) AS month,
@@ -19,19 +254,30 @@ WITH MonthlyFees AS (
   WHERE
     {timestamp_col} >= CURRENT_DATE - INTERVAL '{months}' month
     {additional_where}
+    {partition_filter}
   GROUP BY
     1
-  {union_clauses}
+  {union_clauses}"""
+
+_EQS_TAIL = """
 ), RevenueStability AS (
   SELECT
     month,
     total_fees,
     source,
-    LAG(total_fees) OVER (PARTITION BY source ORDER BY month) AS previous_month_fees,
+    previous_month_fees,
     (
-      total_fees - LAG(total_fees) OVER (PARTITION BY source ORDER BY month)
-    ) / NULLIF(LAG(total_fees) OVER (PARTITION BY source ORDER BY month), 0) AS mom_change
-  FROM MonthlyFees
+      total_fees - previous_month_fees
+    ) / NULLIF(previous_month_fees, 0) AS mom_change
+  FROM (
+    SELECT
+      month,
+      total_fees,
+      source,
+      LAG(total_fees) OVER w AS previous_month_fees
+    FROM MonthlyFees
+    WINDOW w AS (PARTITION BY source ORDER BY month)
+  ) AS lagged
 ), StabilityMagnitudeScores AS (
   SELECT
     source,
@@ -58,70 +304,49 @@ ORDER BY
   source
 """
 
-# Template for User Growth Score (UGS) queries
-UGS_TEMPLATE = """
-WITH user_chains AS (
-  {user_chain_queries}
-), 
-monthly_active_addresses AS (
-  SELECT
-    DATE_TRUNC('month', evt_block_time) AS month,
-    COUNT(DISTINCT evt_tx_from) AS active_addresses
-  FROM user_chains
-  WHERE
-    evt_block_time >= CURRENT_DATE - INTERVAL '{months}' month
-    {additional_where}
-  GROUP BY
-    1
-), transaction_count_volume AS (
+EQS_TEMPLATE = _EQS_MONTHLY_FEES + _EQS_TAIL
+
+# MonthlyFees CTE reading a table that already holds revenue per month and source, such as a
+# Spellbook model materialized nightly; this replaces the per-source scans of daily tables.
+# A model like chainlink.monthly_revenue_by_source would let chainlink use this in place of
+# unioning its five *_reward_daily tables.
+_EQS_ROLLUP_MONTHLY_FEES = """
+WITH MonthlyFees AS (
   SELECT
-    DATE_TRUNC('month', evt_block_time) AS month,
-    COUNT(*) AS transaction_count,
-    SUM(value) AS transaction_volume
-  FROM user_chains
+    {month_col} AS month,
+    SUM({fee_amount_col}) AS total_fees,
+    {source_col} AS source
+  FROM {schema}.{table}
   WHERE
-    evt_block_time >= CURRENT_DATE - INTERVAL '{months}' month
-    {additional_where}
+    {month_col} >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '{months}' month)
   GROUP BY
-    1
+    1, 3"""
+
+# Growth rates, percentiles and final SELECT following the monthly_metrics CTE, shared by
+# the user chain template and the per-table metrics renderers
+_UGS_TAIL = """
 ), growth_rates AS (
-  SELECT
-    m1.month,
-    m1.active_addresses,
-    m2.active_addresses AS previous_active_addresses,
-    (
-      m1.active_addresses - m2.active_addresses
-    ) / NULLIF(m2.active_addresses, 0) * 100 AS active_address_growth_rate,
-    t1.transaction_count,
-    t2.transaction_count AS previous_transaction_count,
-    (
-      t1.transaction_count - t2.transaction_count
-    ) / NULLIF(t2.transaction_count, 0) * 100 AS transaction_count_growth_rate,
-    t1.transaction_volume,
-    t2.transaction_volume AS previous_transaction_volume,
-    (
-      t1.transaction_volume - t2.transaction_volume
-    ) / NULLIF(t2.transaction_volume, 0) * 100 AS transaction_volume_growth_rate
-  FROM monthly_active_addresses AS m1
-  LEFT JOIN monthly_active_addresses AS m2
-    ON m1.month = m2.month + INTERVAL '1' MONTH
-  LEFT JOIN transaction_count_volume AS t1
-    ON m1.month = t1.month
-  LEFT JOIN transaction_count_volume AS t2
-    ON t1.month = t2.month + INTERVAL '1' MONTH
-), percentile_ranking AS (
   SELECT
     month,
     active_addresses,
+    LAG(active_addresses) OVER w AS previous_active_addresses,
+    (
+      active_addresses - LAG(active_addresses) OVER w
+    ) / NULLIF(LAG(active_addresses) OVER w, 0) * 100 AS active_address_growth_rate,
     transaction_count,
+    LAG(transaction_count) OVER w AS previous_transaction_count,
+    (
+      transaction_count - LAG(transaction_count) OVER w
+    ) / NULLIF(LAG(transaction_count) OVER w, 0) * 100 AS transaction_count_growth_rate,
     transaction_volume,
-    active_address_growth_rate,
-    transaction_count_growth_rate,
-    transaction_volume_growth_rate,
-    PERCENT_RANK() OVER (ORDER BY active_addresses) AS active_address_percentile,
-    PERCENT_RANK() OVER (ORDER BY transaction_count) AS transaction_count_percentile,
-    PERCENT_RANK() OVER (ORDER BY transaction_volume) AS transaction_volume_percentile
-  FROM growth_rates
+    LAG(transaction_volume) OVER w AS previous_transaction_volume,
+    (
+      transaction_volume - LAG(transaction_volume) OVER w
+    ) / NULLIF(LAG(transaction_volume) OVER w, 0) * 100 AS transaction_volume_growth_rate
+  FROM monthly_metrics
+  WINDOW w AS (ORDER BY month)
+), percentile_ranking AS (
+  {percentile_ranking_select}
 )
 SELECT
   month,
@@ -139,6 +364,27 @@ ORDER BY
   month DESC
 """
 
+# Template for User Growth Score (UGS) queries: monthly metrics over the unioned user chains,
+# followed by the shared growth and percentile tail
+_UGS_CHAIN_METRICS = """
+WITH user_chains AS (
+  {user_chain_queries}
+), 
+monthly_metrics AS (
+  SELECT
+    DATE_TRUNC('month', evt_block_time) AS month,
+    {active_addresses_expr} AS active_addresses,
+    COUNT(*) AS transaction_count,
+    SUM(value) AS transaction_volume
+  FROM user_chains
+  WHERE
+    evt_block_time >= CURRENT_DATE - INTERVAL '{months}' month
+    {additional_where}
+  GROUP BY
+    1"""
+
+UGS_TEMPLATE = _UGS_CHAIN_METRICS + _UGS_TAIL
+
 # Template for Fair Value Score (FVS) queries
 FVS_TEMPLATE = """
 WITH monthly_metrics AS (
@@ -146,21 +392,13 @@ WITH monthly_metrics AS (
     DATE_TRUNC('month', CURRENT_DATE) AS month,
     {market_cap_value} AS market_cap,
     
-    -- Annual revenue calculation based on most recent months
+    -- Annual revenue over the trailing 12 months
     (
-      SELECT SUM(total_fees)
-      FROM (
-        SELECT
-          DATE_TRUNC('month', {timestamp_col}) AS fee_month,
-          SUM({fee_amount_col}) AS total_fees
-        FROM {protocol_schema}.{revenue_table}
-        WHERE
-          {timestamp_col} >= CURRENT_DATE - INTERVAL '12' month
-          {additional_where}
-        GROUP BY 1
-        ORDER BY 1 DESC
-        LIMIT 12
-      ) recent_revenues
+      SELECT SUM({fee_amount_col})
+      FROM {protocol_schema}.{revenue_table}
+      WHERE
+        {timestamp_col} >= CURRENT_DATE - INTERVAL '12' month
+        {additional_where}
     ) AS annual_revenue
 )
 SELECT
@@ -186,353 +424,685 @@ SELECT
   {security_metrics_subquery} AS security_score
 """
 
-# Helper function to build multi-chain UGS query
-def build_user_chain_queries(chains):
+def _config_mtime_ns(path="protocol_tables.json"):
+    """Get the modification time of the protocol tables file, or None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def compile_template(template):
     """
-    Build the chain-specific subqueries for the UGS template.
+    Compile a format template into a render function.
+    
+    The template is parsed once into literal and placeholder segments; rendering then just
+    joins the segments with the keyword argument values, skipping str.format's parsing.
     
     Args:
-        chains: List of dictionaries with chain-specific table info
+        template: Template string using plain {name} placeholders
         
     Returns:
-        SQL string with UNION ALL subqueries
+        Function taking the placeholder values as keyword arguments
     """
-    queries = []
+    segments = tuple(
+        (literal, field_name)
+        for literal, field_name, _, _ in string.Formatter().parse(template)
+    )
     
-    for i, chain in enumerate(chains):
-        schema = chain.get('schema')
-        table = chain.get('table')
-        user_col = chain.get('user_address_col', 'evt_tx_from')
-        time_col = chain.get('timestamp_col', 'evt_block_time')
-        amount_col = chain.get('amount_col', 'value')
+    def render(**kwargs):
+        return ''.join([
+            literal if field_name is None else literal + str(kwargs[field_name])
+            for literal, field_name in segments
+        ])
+    
+    return render
+
+# Templates are compacted once at import, before their renderers are compiled
+EQS_TEMPLATE = _compact_sql(EQS_TEMPLATE)
+_EQS_ROLLUP_TEMPLATE = _compact_sql(_EQS_ROLLUP_MONTHLY_FEES + _EQS_TAIL)
+UGS_TEMPLATE = _compact_sql(UGS_TEMPLATE)
+FVS_TEMPLATE = _compact_sql(FVS_TEMPLATE)
+SS_TEMPLATE = _compact_sql(SS_TEMPLATE)
+
+# Queries used when a protocol has no configuration, or when building its query fails;
+# formatted with str.format so the text is only laid out once
+_DEFAULT_REVENUE_SQL = _compact_sql("""
+-- Default revenue query for {protocol}
+SELECT
+    DATE_TRUNC('month', block_time) AS month,
+    SUM(fee_usd) AS total_fees,
+    '{protocol}' AS source
+FROM {protocol_ident}.revenue
+WHERE
+    block_time >= CURRENT_DATE - INTERVAL '{months}' month
+GROUP BY 1
+ORDER BY 1 DESC
+""")
+_FALLBACK_REVENUE_SQL = _compact_sql("""
+-- Fallback revenue query for {protocol} (error occurred during query generation)
+SELECT
+    DATE_TRUNC('month', CURRENT_DATE) AS month,
+    0 AS total_fees,
+    '{protocol}' AS source,
+    0 AS mom_change,
+    0 AS avg_mom_change,
+    0 AS stddev_mom_change,
+    0 AS num_months
+""")
+_DEFAULT_USER_GROWTH_SQL = _compact_sql("""
+-- Default user growth query for {protocol}
+WITH monthly_data AS (
+    SELECT
+        DATE_TRUNC('month', block_time) AS month,
+        {active_addresses_expr} AS active_addresses,
+        COUNT(*) AS transaction_count,
+        SUM(amount_usd) AS transaction_volume
+    FROM {protocol_ident}.transactions
+    WHERE
+        block_time >= CURRENT_DATE - INTERVAL '{months}' month
+    GROUP BY 1
+)
+SELECT
+    month,
+    active_addresses,
+    transaction_count,
+    transaction_volume,
+    NULL AS active_address_growth_rate,
+    NULL AS transaction_count_growth_rate,
+    NULL AS transaction_volume_growth_rate,
+    NULL AS active_address_percentile,
+    NULL AS transaction_count_percentile,
+    NULL AS transaction_volume_percentile
+FROM monthly_data
+ORDER BY month DESC
+""")
+_FALLBACK_USER_GROWTH_SQL = _compact_sql("""
+-- Fallback user growth query for {protocol} (error occurred during query generation)
+SELECT
+    DATE_TRUNC('month', CURRENT_DATE) AS month,
+    0 AS active_addresses,
+    0 AS transaction_count,
+    0 AS transaction_volume,
+    0 AS active_address_growth_rate,
+    0 AS transaction_count_growth_rate,
+    0 AS transaction_volume_growth_rate,
+    0 AS active_address_percentile,
+    0 AS transaction_count_percentile,
+    0 AS transaction_volume_percentile
+""")
+
+EQS_RENDER = compile_template(EQS_TEMPLATE)
+_EQS_ROLLUP_RENDER = compile_template(_EQS_ROLLUP_TEMPLATE)
+UGS_RENDER = compile_template(UGS_TEMPLATE)
+FVS_RENDER = compile_template(FVS_TEMPLATE)
+
+# Monthly metrics of single-source user growth queries, keyed on whether users and
+# transactions share a table (one scan) or live in separate tables (two scans joined)
+_UGS_FUSED_METRICS_TEMPLATE = _compact_sql("""
+WITH monthly_metrics AS (
+  SELECT
+    DATE_TRUNC('month', {timestamp_col}) AS month,
+    {active_addresses_expr} AS active_addresses,
+    COUNT(*) AS transaction_count,
+    SUM({amount_col}) AS transaction_volume
+  FROM {protocol_schema}.{user_table}
+  WHERE
+    {timestamp_col} >= CURRENT_DATE - INTERVAL '{months}' month
+    {additional_where}
+    {partition_filter}
+  GROUP BY
+    1
+""")
+_UGS_SPLIT_METRICS_TEMPLATE = _compact_sql("""
+WITH monthly_active_addresses AS (
+  SELECT
+    DATE_TRUNC('month', {timestamp_col}) AS month,
+    {active_addresses_expr} AS active_addresses
+  FROM {protocol_schema}.{user_table}
+  WHERE
+    {timestamp_col} >= CURRENT_DATE - INTERVAL '{months}' month
+    {additional_where}
+    {partition_filter}
+  GROUP BY
+    1
+), transaction_count_volume AS (
+  SELECT
+    DATE_TRUNC('month', {timestamp_col}) AS month,
+    COUNT(*) AS transaction_count,
+    SUM({amount_col}) AS transaction_volume
+  FROM {protocol_schema}.{transaction_table}
+  WHERE
+    {timestamp_col} >= CURRENT_DATE - INTERVAL '{months}' month
+    {additional_where}
+    {partition_filter}
+  GROUP BY
+    1
+), monthly_metrics AS (
+  SELECT
+    a.month,
+    a.active_addresses,
+    t.transaction_count,
+    t.transaction_volume
+  FROM monthly_active_addresses AS a
+  LEFT JOIN transaction_count_volume AS t
+    ON a.month = t.month
+""")
+
+_UGS_TAIL_TEMPLATE = _compact_sql(_UGS_TAIL)
+
+_UGS_METRICS_RENDERERS = {
+    True: compile_template(_UGS_FUSED_METRICS_TEMPLATE),
+    False: compile_template(_UGS_SPLIT_METRICS_TEMPLATE),
+}
+_UGS_TAIL_RENDER = compile_template(_UGS_TAIL_TEMPLATE)
+
+def _chain_sql(i, chain, months=None):
+    """
+    Build the subquery selecting user activity from one chain's table.
+    
+    Args:
+        i: Position of the chain; every chain after the first is prefixed with UNION ALL
+        chain: Dictionary with chain-specific table info
+        months: Number of months to analyze, used to prune partitions when the chain has a partition_col
         
-        query = f"""
+    Returns:
+        SQL string for the chain's subquery
+    """
+    schema = chain.get('schema')
+    table = chain.get('table')
+    partition_col = chain.get('partition_col')
+    additional_where = chain.get('additional_where')
+    expressions = {field: chain.get(field, default) for field, default, _ in _REQUIRED_COLUMNS['user_chain']}
+    if chain.get('amount_decimals'):
+        # Raw token amounts are summed as DOUBLE whole tokens (~16 significant digits) rather than
+        # as wide DECIMALs, which Trino aggregates far more slowly
+        expressions['amount_col'] = f"CAST({expressions['amount_col']} AS DOUBLE) / 1e{int(chain['amount_decimals'])}"
+    columns = ",\n      ".join(
+        f"{expressions[field]} AS {alias}" for field, _, alias in _REQUIRED_COLUMNS['user_chain']
+    )
+    
+    sql = f"""
     {'SELECT' if i == 0 else 'UNION ALL SELECT'}
-      {user_col} AS evt_tx_from,
-      {time_col} AS evt_block_time,
-      {amount_col} AS value
+      {columns}
     FROM {schema}.{table}"""
-        
-        queries.append(query)
+    conditions = []
+    if partition_col and months is not None:
+        conditions.append(_PARTITION_FILTER.format(partition_col=partition_col, months=months))
+    if additional_where:
+        # Lets one curated table (e.g. dex.trades) stand in for several per-version chain tables
+        conditions.append(_LEADING_AND.sub('', additional_where).strip())
+    if conditions:
+        sql += "\n    WHERE " + "\n      AND ".join(conditions)
+    return sql
+
+@functools.lru_cache(maxsize=128)
+def _cached_user_chain_queries(chains_key, months=None):
+    """Build the chain subqueries for a JSON-encoded chain list, memoized per distinct config and months."""
+    chains = json.loads(chains_key)
+    return "\n".join(_chain_sql(i, chain, months) for i, chain in enumerate(chains))
+
+# Fixed SQL fragments of the UNION ALL clause added to EQS queries for each extra revenue source
+_UNION_SELECT_MONTH = "\n  UNION ALL\n  SELECT\n    DATE_TRUNC('month', "
+_UNION_SUM_FEES = ") AS month,\n    SUM("
+_UNION_SOURCE = ") AS total_fees,\n    '"
+_UNION_FROM = "' AS source\n  FROM "
+_UNION_WHERE = "\n  WHERE\n    "
+_UNION_INTERVAL = " >= CURRENT_DATE - INTERVAL '"
+_UNION_ADDITIONAL_WHERE = "' month\n    "
+_UNION_PARTITION_FILTER = "\n    "
+_UNION_GROUP_BY = "\n  GROUP BY\n    1"
+
+# Placeholder chain subquery for protocols that configure an empty user_addresses list
+_EMPTY_USER_CHAINS_SQL = (
+    "SELECT CAST(NULL AS VARCHAR) AS evt_tx_from, CAST(NULL AS TIMESTAMP) AS evt_block_time, "
+    "CAST(NULL AS DOUBLE) AS value WHERE 1=0"
+)
+
+# Columns projected from the tables behind each template slot, as (config field, default
+# column, alias). Sources are never read with SELECT *, so Dune's columnar scans only touch these.
+_REQUIRED_COLUMNS = {
+    'user_chain': (
+        ('user_address_col', 'evt_tx_from', 'evt_tx_from'),
+        ('timestamp_col', 'evt_block_time', 'evt_block_time'),
+        ('amount_col', 'value', 'value'),
+    ),
+}
+
+# Projection of every column, which generated queries must not contain
+_SELECT_STAR = re.compile(r'\bSELECT\s+(?:DISTINCT\s+)?\*', re.IGNORECASE)
+
+def _check_projection(sql):
+    """Raise ValueError if a generated query selects all columns of a table."""
+    if _SELECT_STAR.search(sql):
+        raise ValueError("Generated query reads whole rows with SELECT *")
+    return sql
+
+# Helper function to build multi-chain UGS query
+
+def build_user_chain_queries(chains, months=None):
+    """
+    Build the chain-specific subqueries for the UGS template.
     
-    return "\n".join(queries)
+    Args:
+        chains: List of dictionaries with chain-specific table info
+        months: Number of months to analyze, used to prune partitioned chain tables
+        
+    Returns:
+        SQL string with UNION ALL subqueries
+    """
+    if not chains:
+        # An empty CTE body is a syntax error on Dune, so select no rows with the expected columns
+        return _EMPTY_USER_CHAINS_SQL
+    return _cached_user_chain_queries(json.dumps(chains, sort_keys=True), months)
+
+# Protocol names eligible for the query caches, so malformed names cannot evict real protocols
+_CACHEABLE_PROTOCOL = re.compile(r'^[a-z][a-z0-9_]*$')
+
+# Names usable as the schema of an unconfigured protocol's default query
+_SCHEMA_RE = re.compile(r'^[a-z][a-z0-9_]{0,63}$')
+
+def _check_protocol_name(protocol):
+    """Raise ValueError for an unconfigured protocol whose name cannot be used as a schema."""
+    if not _SCHEMA_RE.fullmatch(protocol) and protocol not in _load_protocol_tables():
+        raise ValueError(f"Invalid protocol name: {protocol!r}")
 
 # Functions required by the existing DuneClient implementation
-def get_revenue_query(protocol, months=12):
+
+def get_revenue_query(protocol, months=12, limit=None):
     """
     Generate a revenue query for a specific protocol.
     
+    Queries are memoized per lowercased protocol name and months, and invalidated when
+    protocol_tables.json changes. Names that are not plain identifiers are built uncached, and
+    ValueError is raised for unconfigured names that are not valid schema names.
+    
     Args:
         protocol: Protocol name (e.g., 'chainlink')
         months: Number of months to analyze
+        limit: Number of rows to return, latest months first (None for all)
         
     Returns:
         SQL query string for revenue data
     """
-    try:
-        # Get protocol configuration
-        protocol_data = None
-        protocol_tables_path = "protocol_tables.json"
-        
-        if os.path.exists(protocol_tables_path):
-            with open(protocol_tables_path, 'r') as f:
-                all_protocol_data = json.load(f)
-                protocol_data = all_protocol_data.get(protocol.lower())
-        
-        if not protocol_data:
-            logger.warning(f"No configuration found for {protocol}. Using default template.")
-            return f"""
-            -- Default revenue query for {protocol}
-            SELECT
-                DATE_TRUNC('month', block_time) AS month,
-                SUM(fee_usd) AS total_fees,
-                '{protocol}' AS source
-            FROM {protocol}.revenue
-            WHERE
-                block_time >= CURRENT_DATE - INTERVAL '{months}' month
-            GROUP BY 1
-            ORDER BY 1 DESC
-            """
+    protocol = protocol.lower()
+    _check_protocol_name(protocol)
+    if not _CACHEABLE_PROTOCOL.match(protocol):
+        return _apply_limit(_compact_sql(_build_revenue_query(protocol, months)), limit)
+    
+    hits = _get_revenue_query_cached.cache_info().hits
+    query = _get_revenue_query_cached(protocol, months, _config_mtime_ns())
+    if logger.isEnabledFor(logging.DEBUG):
+        outcome = 'hit' if _get_revenue_query_cached.cache_info().hits > hits else 'miss'
+        logger.debug("Revenue query cache %s for %s (%s months)", outcome, protocol, months)
+    return _apply_limit(query, limit)
+
+@functools.lru_cache(maxsize=256)
+def _get_revenue_query_cached(protocol, months, config_mtime):
+    """
+    Build a compacted revenue query for a specific protocol.
+    
+    Args:
+        protocol: Protocol name (e.g., 'chainlink')
+        months: Number of months to analyze
+        config_mtime: Modification time of protocol_tables.json, only used as part of the cache key
         
-        # Build query based on protocol configuration
-        if 'revenue_sources' in protocol_data:
-            # Multiple revenue sources
-            sources = protocol_data['revenue_sources']
-            
-            # Use EQS template with the first source as the primary query
-            primary_source = sources[0]
-            
-            source_name = primary_source.get('name', 'total')
-            schema = primary_source.get('schema', protocol)
-            table = primary_source.get('table', 'revenue')
-            timestamp_col = primary_source.get('timestamp_col', 'block_time')
-            fee_amount_col = primary_source.get('fee_amount_col', 'fee_usd')
-            additional_where = primary_source.get('additional_where', '')
-            
-            # Format additional WHERE if present
-            if additional_where and not additional_where.strip().startswith('AND'):
-                additional_where = f"AND {additional_where}"
-            
-            # Build union clauses for other sources
-            union_clauses = []
-            for i, source in enumerate(sources[1:], 1):
-                source_name_i = source.get('name', f'source_{i}')
-                schema_i = source.get('schema', protocol)
-                table_i = source.get('table', 'revenue')
-                timestamp_col_i = source.get('timestamp_col', 'block_time')
-                fee_amount_col_i = source.get('fee_amount_col', 'fee_usd')
-                additional_where_i = source.get('additional_where', '')
-                
-                # Format additional WHERE if present
-                if additional_where_i and not additional_where_i.strip().startswith('AND'):
-                    additional_where_i = f"AND {additional_where_i}"
-                
-                union_clause = f"""
-  UNION ALL
-  SELECT
-    DATE_TRUNC('month', {timestamp_col_i}) AS month,
-    SUM({fee_amount_col_i}) AS total_fees,
-    '{source_name_i}' AS source
-  FROM {schema_i}.{table_i}
-  WHERE
-    {timestamp_col_i} >= CURRENT_DATE - INTERVAL '{months}' month
-    {additional_where_i}
-  GROUP BY
-    1"""
-                union_clauses.append(union_clause)
-            
-            # Format the main query
-            query = EQS_TEMPLATE.format(
-                protocol_schema=schema,
-                revenue_table=table,
-                timestamp_col=timestamp_col,
-                fee_amount_col=fee_amount_col,
-                source=source_name,
-                months=months,
-                additional_where=additional_where,
-                union_clauses=''.join(union_clauses)
-            )
-            
-            return query
-        else:
-            # Simple revenue query (single source)
-            schema = protocol_data.get('protocol_schema', protocol)
-            table = protocol_data.get('revenue_table', 'revenue')
-            timestamp_col = protocol_data.get('timestamp_col', 'block_time')
-            fee_amount_col = protocol_data.get('fee_amount_col', 'fee_usd')
-            additional_where = protocol_data.get('additional_where', '')
-            
-            # Format additional WHERE if present
-            if additional_where and not additional_where.strip().startswith('AND'):
-                additional_where = f"AND {additional_where}"
-            
-            # Format the query
-            query = EQS_TEMPLATE.format(
-                protocol_schema=schema,
-                revenue_table=table,
-                timestamp_col=timestamp_col,
-                fee_amount_col=fee_amount_col,
-                source=protocol,
-                months=months,
-                additional_where=additional_where,
-                union_clauses=''
-            )
-            
-            return query
+    Returns:
+        SQL query string for revenue data
+    """
+    return _compact_sql(_build_revenue_query(protocol, months))
+
+def _build_revenue_query(protocol, months):
+    """
+    Build a revenue query for a specific protocol.
     
+    Args:
+        protocol: Protocol name (e.g., 'chainlink')
+        months: Number of months to analyze
+        
+    Returns:
+        SQL query string for revenue data
+    """
+    try:
+        return _build_query('revenue', protocol, months)
     except Exception as e:
         logger.error(f"Error generating revenue query for {protocol}: {str(e)}")
-        return f"""
-        -- Fallback revenue query for {protocol} (error occurred during query generation)
-        SELECT
-            DATE_TRUNC('month', CURRENT_DATE) AS month,
-            0 AS total_fees,
-            '{protocol}' AS source,
-            0 AS mom_change,
-            0 AS avg_mom_change,
-            0 AS stddev_mom_change,
-            0 AS num_months
-        """
-
-def get_user_growth_query(protocol, months=12):
+        return _FALLBACK_REVENUE_SQL.format(protocol=protocol)
+
+def get_user_growth_query(protocol, months=12, exact=False, limit=None):
     """
     Generate a user growth query for a specific protocol.
     
+    Queries are memoized per lowercased protocol name and months, and invalidated when
+    protocol_tables.json changes. Names that are not plain identifiers are built uncached, and
+    ValueError is raised for unconfigured names that are not valid schema names.
+    
+    Active addresses are counted with approx_distinct unless exact is set or USE_APPROX_DISTINCT
+    is turned off; its 2.3% standard error is well below month-over-month growth noise.
+    
     Args:
         protocol: Protocol name (e.g., 'chainlink')
         months: Number of months to analyze
+        exact: Count active addresses with an exact COUNT(DISTINCT ...)
+        limit: Number of rows to return, latest months first (None for all)
         
     Returns:
         SQL query string for user growth data
     """
-    try:
-        # Get protocol configuration
-        protocol_data = None
-        protocol_tables_path = "protocol_tables.json"
+    protocol = protocol.lower()
+    approx_distinct = USE_APPROX_DISTINCT and not exact
+    _check_protocol_name(protocol)
+    if not _CACHEABLE_PROTOCOL.match(protocol):
+        return _apply_limit(_compact_sql(_build_user_growth_query(protocol, months, approx_distinct)), limit)
+    
+    hits = _get_user_growth_query_cached.cache_info().hits
+    query = _get_user_growth_query_cached(
+        protocol, months, _config_mtime_ns(), approx_distinct, USE_INLINE_PERCENT_RANK
+    )
+    if logger.isEnabledFor(logging.DEBUG):
+        outcome = 'hit' if _get_user_growth_query_cached.cache_info().hits > hits else 'miss'
+        logger.debug("User growth query cache %s for %s (%s months)", outcome, protocol, months)
+    return _apply_limit(query, limit)
+
+def get_parameterized_revenue_query(protocol, months=12, limit=None):
+    """
+    Generate a revenue query that takes the lookback months as a Dune query parameter.
+    
+    The SQL text is the same for every months value, so it is shared across calls and by Dune.
+    A row limit, if given, is passed as a parameter as well.
+    
+    Args:
+        protocol: Protocol name (e.g., 'chainlink')
+        months: Number of months to analyze
+        limit: Number of rows to return, latest months first (None for all)
+        
+    Returns:
+        Tuple of (SQL query string, query parameters dictionary)
+    """
+    if limit is None:
+        return get_revenue_query(protocol, MONTHS_PARAM), {'months': months}
+    _check_limit(limit)
+    return get_revenue_query(protocol, MONTHS_PARAM, LIMIT_PARAM), {'months': months, 'limit': limit}
+
+def get_parameterized_user_growth_query(protocol, months=12, exact=False, limit=None):
+    """
+    Generate a user growth query that takes the lookback months as a Dune query parameter.
+    
+    Args:
+        protocol: Protocol name (e.g., 'chainlink')
+        months: Number of months to analyze
+        exact: Count active addresses with an exact COUNT(DISTINCT ...)
+        limit: Number of rows to return, latest months first (None for all)
         
-        if os.path.exists(protocol_tables_path):
-            with open(protocol_tables_path, 'r') as f:
-                all_protocol_data = json.load(f)
-                protocol_data = all_protocol_data.get(protocol.lower())
+    Returns:
+        Tuple of (SQL query string, query parameters dictionary)
+    """
+    if limit is None:
+        return get_user_growth_query(protocol, MONTHS_PARAM, exact), {'months': months}
+    _check_limit(limit)
+    query = get_user_growth_query(protocol, MONTHS_PARAM, exact, LIMIT_PARAM)
+    return query, {'months': months, 'limit': limit}
+
+def get_protocol_queries(protocol, months=12):
+    """
+    Generate both the revenue and the user growth query for a protocol.
+    
+    Args:
+        protocol: Protocol name (e.g., 'chainlink')
+        months: Number of months to analyze
         
-        if not protocol_data:
-            logger.warning(f"No configuration found for {protocol}. Using default template.")
-            return f"""
-            -- Default user growth query for {protocol}
-            WITH monthly_data AS (
-                SELECT
-                    DATE_TRUNC('month', block_time) AS month,
-                    COUNT(DISTINCT user_address) AS active_addresses,
-                    COUNT(*) AS transaction_count,
-                    SUM(amount_usd) AS transaction_volume
-                FROM {protocol}.transactions
-                WHERE
-                    block_time >= CURRENT_DATE - INTERVAL '{months}' month
-                GROUP BY 1
-                ORDER BY 1 DESC
-            )
-            SELECT
-                month,
-                active_addresses,
-                transaction_count,
-                transaction_volume,
-                NULL AS active_address_growth_rate,
-                NULL AS transaction_count_growth_rate,
-                NULL AS transaction_volume_growth_rate,
-                NULL AS active_address_percentile,
-                NULL AS transaction_count_percentile,
-                NULL AS transaction_volume_percentile
-            FROM monthly_data
-            """
+    Returns:
+        Dictionary with 'revenue' and 'user_growth' SQL query strings
+    """
+    return {
+        'revenue': get_revenue_query(protocol, months),
+        'user_growth': get_user_growth_query(protocol, months)
+    }
+
+@functools.lru_cache(maxsize=256)
+def _get_user_growth_query_cached(protocol, months, config_mtime, approx_distinct, inline_percent_rank):
+    """
+    Build a compacted user growth query for a specific protocol.
+    
+    Args:
+        protocol: Protocol name (e.g., 'chainlink')
+        months: Number of months to analyze
+        config_mtime: Modification time of protocol_tables.json, only used as part of the cache key
+        approx_distinct: Whether to count active addresses with approx_distinct
+        inline_percent_rank: Current USE_INLINE_PERCENT_RANK setting, only used as part of the cache key
         
-        # Build query based on protocol configuration
-        if 'user_addresses' in protocol_data:
-            # Get user chain specifications
-            user_chains = protocol_data['user_addresses']
-            
-            # Generate chain queries
-            user_chain_queries = build_user_chain_queries(user_chains)
-            additional_where = protocol_data.get('additional_where', '')
-            
-            # Format additional WHERE if present
-            if additional_where and not additional_where.strip().startswith('AND'):
-                additional_where = f"AND {additional_where}"
-            
-            # Format the query
-            query = UGS_TEMPLATE.format(
-                user_chain_queries=user_chain_queries,
-                months=months,
-                additional_where=additional_where
-            )
-            
-            return query
-        else:
-            # Simple user growth query (single source)
-            schema = protocol_data.get('protocol_schema', protocol)
-            user_table = protocol_data.get('user_table', 'users')
-            transaction_table = protocol_data.get('transaction_table', 'transactions')
-            timestamp_col = protocol_data.get('timestamp_col', 'block_time')
-            user_address_col = protocol_data.get('user_address_col', 'user_address')
-            amount_col = protocol_data.get('amount_col', 'amount_usd')
-            additional_where = protocol_data.get('additional_where', '')
-            
-            # Format additional WHERE if present
-            if additional_where and not additional_where.strip().startswith('AND'):
-                additional_where = f"AND {additional_where}"
-            
-            # Generate simplified UGS query
-            query = f"""
-            WITH monthly_active_addresses AS (
-              SELECT
-                DATE_TRUNC('month', {timestamp_col}) AS month,
-                COUNT(DISTINCT {user_address_col}) AS active_addresses
-              FROM {schema}.{user_table}
-              WHERE
-                {timestamp_col} >= CURRENT_DATE - INTERVAL '{months}' month
-                {additional_where}
-              GROUP BY
-                1
-            ), transaction_count_volume AS (
-              SELECT
-                DATE_TRUNC('month', {timestamp_col}) AS month,
-                COUNT(*) AS transaction_count,
-                SUM({amount_col}) AS transaction_volume
-              FROM {schema}.{transaction_table}
-              WHERE
-                {timestamp_col} >= CURRENT_DATE - INTERVAL '{months}' month
-                {additional_where}
-              GROUP BY
-                1
-            ), growth_rates AS (
-              SELECT
-                m1.month,
-                m1.active_addresses,
-                m2.active_addresses AS previous_active_addresses,
-                (
-                  m1.active_addresses - m2.active_addresses
-                ) / NULLIF(m2.active_addresses, 0) * 100 AS active_address_growth_rate,
-                t1.transaction_count,
-                t2.transaction_count AS previous_transaction_count,
-                (
-                  t1.transaction_count - t2.transaction_count
-                ) / NULLIF(t2.transaction_count, 0) * 100 AS transaction_count_growth_rate,
-                t1.transaction_volume,
-                t2.transaction_volume AS previous_transaction_volume,
-                (
-                  t1.transaction_volume - t2.transaction_volume
-                ) / NULLIF(t2.transaction_volume, 0) * 100 AS transaction_volume_growth_rate
-              FROM monthly_active_addresses AS m1
-              LEFT JOIN monthly_active_addresses AS m2
-                ON m1.month = m2.month + INTERVAL '1' MONTH
-              LEFT JOIN transaction_count_volume AS t1
-                ON m1.month = t1.month
-              LEFT JOIN transaction_count_volume AS t2
-                ON t1.month = t2.month + INTERVAL '1' MONTH
-            ), percentile_ranking AS (
-              SELECT
-                month,
-                active_addresses,
-                transaction_count,
-                transaction_volume,
-                active_address_growth_rate,
-                transaction_count_growth_rate,
-                transaction_volume_growth_rate,
-                PERCENT_RANK() OVER (ORDER BY active_addresses) AS active_address_percentile,
-                PERCENT_RANK() OVER (ORDER BY transaction_count) AS transaction_count_percentile,
-                PERCENT_RANK() OVER (ORDER BY transaction_volume) AS transaction_volume_percentile
-              FROM growth_rates
-            )
-            SELECT
-              month,
-              active_addresses,
-              transaction_count,
-              transaction_volume,
-              active_address_growth_rate,
-              transaction_count_growth_rate,
-              transaction_volume_growth_rate,
-              active_address_percentile,
-              transaction_count_percentile,
-              transaction_volume_percentile
-            FROM percentile_ranking
-            ORDER BY
-              month DESC
-            """
-            
-            return query
+    Returns:
+        SQL query string for user growth data
+    """
+    return _compact_sql(_build_user_growth_query(protocol, months, approx_distinct))
+
+def _build_user_growth_query(protocol, months, approx_distinct=True):
+    """
+    Build a user growth query for a specific protocol.
     
+    Args:
+        protocol: Protocol name (e.g., 'chainlink')
+        months: Number of months to analyze
+        approx_distinct: Whether to count active addresses with approx_distinct
+        
+    Returns:
+        SQL query string for user growth data
+    """
+    try:
+        return _build_query('user_growth', protocol, months, approx_distinct=approx_distinct)
     except Exception as e:
         logger.error(f"Error generating user growth query for {protocol}: {str(e)}")
-        return f"""
-        -- Fallback user growth query for {protocol} (error occurred during query generation)
-        SELECT
-            DATE_TRUNC('month', CURRENT_DATE) AS month,
-            0 AS active_addresses,
-            0 AS transaction_count,
-            0 AS transaction_volume,
-            0 AS active_address_growth_rate,
-            0 AS transaction_count_growth_rate,
-            0 AS transaction_volume_growth_rate,
-            0 AS active_address_percentile,
-            0 AS transaction_count_percentile,
-            0 AS transaction_volume_percentile
-        """
\ No newline at end of file
+        return _FALLBACK_USER_GROWTH_SQL.format(protocol=protocol)
+
+def _default_revenue_query(protocol, protocol_ident, protocol_data, months):
+    """Build the revenue query for a protocol without configuration."""
+    return _DEFAULT_REVENUE_SQL.format(protocol=protocol, protocol_ident=protocol_ident, months=months)
+
+def _multi_source_revenue_query(protocol, protocol_ident, protocol_data, months):
+    """Build the revenue query for a protocol with several revenue sources."""
+    sources = protocol_data['revenue_sources']
+    
+    # Use EQS template with the first source as the primary query
+    primary_source = sources[0]
+    
+    source_name = primary_source.get('name', 'total')
+    schema = primary_source.get('schema', protocol_ident)
+    table = primary_source.get('table', 'revenue')
+    timestamp_col = primary_source.get('timestamp_col', 'block_time')
+    fee_amount_col = primary_source.get('fee_amount_col', 'fee_usd')
+    additional_where = primary_source.get('additional_where', '')
+    
+    # Build union clauses for other sources into a single buffer
+    union_buf = io.StringIO()
+    for i, source in enumerate(sources[1:], 1):
+        timestamp_col_i = source.get('timestamp_col', 'block_time')
+        
+        union_buf.write(_UNION_SELECT_MONTH)
+        union_buf.write(timestamp_col_i)
+        union_buf.write(_UNION_SUM_FEES)
+        union_buf.write(source.get('fee_amount_col', 'fee_usd'))
+        union_buf.write(_UNION_SOURCE)
+        union_buf.write(source.get('name', f'source_{i}'))
+        union_buf.write(_UNION_FROM)
+        union_buf.write(source.get('schema', protocol_ident))
+        union_buf.write('.')
+        union_buf.write(source.get('table', 'revenue'))
+        union_buf.write(_UNION_WHERE)
+        union_buf.write(timestamp_col_i)
+        union_buf.write(_UNION_INTERVAL)
+        union_buf.write(str(months))
+        union_buf.write(_UNION_ADDITIONAL_WHERE)
+        union_buf.write(source.get('additional_where', ''))
+        union_buf.write(_UNION_PARTITION_FILTER)
+        union_buf.write(_partition_filter(source, months))
+        union_buf.write(_UNION_GROUP_BY)
+    
+    # Format the main query
+    query = EQS_RENDER(
+        protocol_schema=schema,
+        revenue_table=table,
+        timestamp_col=timestamp_col,
+        fee_amount_col=fee_amount_col,
+        source=source_name,
+        months=months,
+        additional_where=additional_where,
+        partition_filter=_partition_filter(primary_source, months),
+        union_clauses=union_buf.getvalue()
+    )
+    
+    return query
+
+def _single_source_revenue_query(protocol, protocol_ident, protocol_data, months):
+    """Build the revenue query for a protocol with a single revenue table."""
+    schema = protocol_data.get('protocol_schema', protocol_ident)
+    table = protocol_data.get('revenue_table', 'revenue')
+    timestamp_col = protocol_data.get('timestamp_col', 'block_time')
+    fee_amount_col = protocol_data.get('fee_amount_col', 'fee_usd')
+    additional_where = protocol_data.get('additional_where', '')
+    
+    # Format the query
+    query = EQS_RENDER(
+        protocol_schema=schema,
+        revenue_table=table,
+        timestamp_col=timestamp_col,
+        fee_amount_col=fee_amount_col,
+        source=protocol,
+        months=months,
+        additional_where=additional_where,
+        partition_filter=_partition_filter(protocol_data, months),
+        union_clauses=''
+    )
+    
+    return query
+
+def _rollup_revenue_query(protocol, protocol_ident, protocol_data, months):
+    """Build the revenue query for a protocol whose revenue is pre-aggregated per month and source."""
+    rollup = protocol_data['revenue_rollup']
+    
+    return _EQS_ROLLUP_RENDER(
+        schema=rollup.get('schema', protocol_ident),
+        table=rollup['table'],
+        month_col=rollup.get('month_col', 'month'),
+        source_col=rollup.get('source_col', 'source'),
+        fee_amount_col=rollup.get('fee_amount_col', 'total_fees'),
+        months=months
+    )
+
+def _default_user_growth_query(protocol, protocol_ident, protocol_data, months, approx_distinct=True):
+    """Build the user growth query for a protocol without configuration."""
+    return _DEFAULT_USER_GROWTH_SQL.format(
+        protocol=protocol, protocol_ident=protocol_ident, months=months,
+        active_addresses_expr=_distinct_count('user_address', approx_distinct)
+    )
+
+def _chain_user_growth_query(protocol, protocol_ident, protocol_data, months, approx_distinct=True):
+    """Build the user growth query for a protocol with per-chain transfer tables."""
+    # Get user chain specifications
+    user_chains = protocol_data['user_addresses']
+    
+    # Generate chain queries
+    user_chain_queries = build_user_chain_queries(user_chains, months)
+    additional_where = protocol_data.get('additional_where', '')
+    
+    # Format the query
+    query = UGS_RENDER(
+        user_chain_queries=user_chain_queries,
+        active_addresses_expr=_distinct_count('evt_tx_from', approx_distinct),
+        months=months,
+        additional_where=additional_where,
+        percentile_ranking_select=_percentile_ranking_select()
+    )
+    
+    return query
+
+def _single_source_user_growth_query(protocol, protocol_ident, protocol_data, months, approx_distinct=True):
+    """Build the user growth query for a protocol with its own user and transaction tables."""
+    schema = protocol_data.get('protocol_schema', protocol_ident)
+    user_table = protocol_data.get('user_table', 'users')
+    transaction_table = protocol_data.get('transaction_table', 'transactions')
+    timestamp_col = protocol_data.get('timestamp_col', 'block_time')
+    user_address_col = protocol_data.get('user_address_col', 'user_address')
+    amount_col = protocol_data.get('amount_col', 'amount_usd')
+    additional_where = protocol_data.get('additional_where', '')
+    
+    # Per-month metrics in a single scan when users and transactions share a table
+    render_metrics = _UGS_METRICS_RENDERERS[user_table == transaction_table]
+    query = render_metrics(
+        protocol_schema=schema,
+        user_table=user_table,
+        transaction_table=transaction_table,
+        timestamp_col=timestamp_col,
+        active_addresses_expr=_distinct_count(user_address_col, approx_distinct),
+        amount_col=amount_col,
+        months=months,
+        additional_where=additional_where,
+        partition_filter=_partition_filter(protocol_data, months)
+    ) + "\n" + _UGS_TAIL_RENDER(percentile_ranking_select=_percentile_ranking_select())
+    
+    return query
+
+# Config keys selecting a query shape other than the single-table one, in order of precedence
+_SHAPE_KEYS = {
+    'revenue': (('rollup', 'revenue_rollup'), ('multi', 'revenue_sources')),
+    'user_growth': (('multi', 'user_addresses'),),
+}
+
+# Query builders keyed by (metric, config shape); each takes (protocol, protocol_ident,
+# protocol_data, months) plus any metric-specific options and returns the SQL text
+_BUILDERS = {
+    ('revenue', 'default'): _default_revenue_query,
+    ('revenue', 'rollup'): _rollup_revenue_query,
+    ('revenue', 'multi'): _multi_source_revenue_query,
+    ('revenue', 'single'): _single_source_revenue_query,
+    ('user_growth', 'default'): _default_user_growth_query,
+    ('user_growth', 'multi'): _chain_user_growth_query,
+    ('user_growth', 'single'): _single_source_user_growth_query,
+}
+
+def _build_query(metric, protocol, months, **options):
+    """
+    Build a query for a protocol with the builder matching its configuration.
+    
+    Args:
+        metric: Metric to query ('revenue' or 'user_growth')
+        protocol: Protocol name (e.g., 'chainlink')
+        months: Number of months to analyze
+        **options: Metric-specific builder options (e.g. approx_distinct for user growth)
+        
+    Returns:
+        SQL query string
+    """
+    protocol_data = _load_protocol_tables().get(protocol.lower())
+    if not protocol_data:
+        logger.warning(f"No configuration found for {protocol}. Using default template.")
+        shape = 'default'
+    else:
+        shape = next(
+            (shape for shape, key in _SHAPE_KEYS[metric] if key in protocol_data), 'single'
+        )
+    
+    return _check_projection(
+        _BUILDERS[(metric, shape)](protocol, quote_identifier(protocol), protocol_data, months, **options)
+    )
+
+# Public query functions per metric
+_QUERY_FUNCTIONS = {
+    'revenue': get_revenue_query,
+    'user_growth': get_user_growth_query,
+}
+
+def build_query(protocol, metric, months=12):
+    """
+    Generate a query for a specific protocol and metric.
+    
+    Args:
+        protocol: Protocol name (e.g., 'chainlink')
+        metric: Metric to query ('revenue' or 'user_growth')
+        months: Number of months to analyze
+        
+    Returns:
+        SQL query string
+    """
+    query_function = _QUERY_FUNCTIONS.get(metric)
+    if query_function is None:
+        raise ValueError(f"Unknown metric: {metric}")
+    return query_function(protocol, months)
@@ -1,6 +1,7 @@
 import logging
-from flask import render_template, request, jsonify, flash, redirect, url_for
-from sqlalchemy import desc
+import time
+from flask import render_template, request, jsonify, flash, redirect, url_for, abort, g, stream_with_context, current_app
+from sqlalchemy import desc, func, tuple_
 from models import Protocol, Score, Category, RevenueData, UserData
 from app import db
 from data_processor import DataProcessor
@@ -8,210 +9,391 @@ from score_calculator import ScoreCalculator
 
 logger = logging.getLogger(__name__)
 
-def register_routes(app):
-    """Register all routes with the Flask app"""
+# Ids of protocols recently seen in the database, mapped to when that sighting expires; a
+# deleted protocol is reported missing again after at most PROTOCOL_EXISTS_TTL seconds, and
+# the oldest sightings are dropped once PROTOCOL_EXISTS_CACHE_SIZE ids are cached
+PROTOCOL_EXISTS_TTL = 60
+PROTOCOL_EXISTS_CACHE_SIZE = 1024
+_known_protocol_ids = {}
+
+def protocol_exists(protocol_id):
+    """Check whether a protocol exists, memoised for the request and cached for PROTOCOL_EXISTS_TTL seconds"""
+    checked = g.setdefault('protocol_exists', {})
+    if protocol_id in checked:
+        return checked[protocol_id]
     
-    @app.route('/')
-    def index():
-        """Home page with top protocols by How3 score"""
-        top_protocols = db.session.query(Protocol, Score) \
-            .join(Score, Protocol.id == Score.protocol_id) \
-            .order_by(desc(Score.how3_score)) \
-            .limit(10) \
-            .all()
-            
-        categories = Category.query.all()
-        
-        return render_template('index.html', 
-                              protocols=top_protocols,
-                              categories=categories)
-    
-    @app.route('/protocols')
-    def protocols():
-        """List all protocols with their scores"""
-        category_filter = request.args.get('category')
-        sort_by = request.args.get('sort_by', 'how3_score')
-        sort_order = request.args.get('sort_order', 'desc')
-        
-        query = db.session.query(Protocol, Score) \
-            .join(Score, Protocol.id == Score.protocol_id)
-            
-        if category_filter:
-            query = query.filter(Protocol.category == category_filter)
-        
-        # Apply sorting
-        if sort_by == 'earnings_quality_score':
-            query = query.order_by(desc(Score.earnings_quality_score) if sort_order == 'desc' else Score.earnings_quality_score)
-        elif sort_by == 'user_growth_score':
-            query = query.order_by(desc(Score.user_growth_score) if sort_order == 'desc' else Score.user_growth_score)
-        elif sort_by == 'fair_value_score':
-            query = query.order_by(desc(Score.fair_value_score) if sort_order == 'desc' else Score.fair_value_score)
-        elif sort_by == 'safety_score':
-            query = query.order_by(desc(Score.safety_score) if sort_order == 'desc' else Score.safety_score)
-        else:  # Default to how3_score
-            query = query.order_by(desc(Score.how3_score) if sort_order == 'desc' else Score.how3_score)
-        
-        protocols = query.all()
-        categories = Category.query.all()
-        
-        return render_template('protocols.html',
-                              protocols=protocols,
-                              categories=categories,
-                              selected_category=category_filter,
-                              sort_by=sort_by,
-                              sort_order=sort_order)
-    
-    @app.route('/protocol/<int:protocol_id>')
-    def protocol_detail(protocol_id):
-        """Detailed view for a specific protocol"""
-        protocol = Protocol.query.get_or_404(protocol_id)
-        score = Score.query.filter_by(protocol_id=protocol_id).first()
-        
-        # Get historical revenue data
-        revenue_data = RevenueData.query.filter_by(protocol_id=protocol_id) \
-            .order_by(RevenueData.month) \
-            .all()
-            
-        # Get historical user data
-        user_data = UserData.query.filter_by(protocol_id=protocol_id) \
-            .order_by(UserData.month) \
-            .all()
-            
-        # Get category peers for comparison
-        category_peers = db.session.query(Protocol, Score) \
-            .join(Score, Protocol.id == Score.protocol_id) \
-            .filter(Protocol.category == protocol.category) \
-            .filter(Protocol.id != protocol_id) \
-            .order_by(desc(Score.how3_score)) \
-            .limit(5) \
+    now = time.monotonic()
+    expires_at = _known_protocol_ids.get(protocol_id)
+    if expires_at is not None and now < expires_at:
+        exists = True
+    else:
+        exists = db.session.query(Protocol.query.filter(Protocol.id == protocol_id).exists()).scalar()
+        # Re-inserting keeps the dict in expiry order, so the first entry is the oldest
+        _known_protocol_ids.pop(protocol_id, None)
+        if exists:
+            if len(_known_protocol_ids) >= PROTOCOL_EXISTS_CACHE_SIZE:
+                del _known_protocol_ids[next(iter(_known_protocol_ids))]
+            _known_protocol_ids[protocol_id] = now + PROTOCOL_EXISTS_TTL
+    
+    checked[protocol_id] = exists
+    return exists
+
+# Score columns the protocols list can be sorted by, keyed by the sort_by query parameter
+SORT_COLUMNS = {
+    'how3_score': Score.how3_score,
+    'earnings_quality_score': Score.earnings_quality_score,
+    'user_growth_score': Score.user_growth_score,
+    'fair_value_score': Score.fair_value_score,
+    'safety_score': Score.safety_score,
+}
+
+# Protocols shown per page of the protocols list
+PROTOCOLS_PER_PAGE = 50
+
+# Stand-in sort value for protocols without a score; scores are 0-100, so unscored
+# protocols sort after every score in descending order and before them in ascending order
+NULL_SCORE_SORT_VALUE = -1.0
+
+def parse_cursor(cursor):
+    """Parse a 'sort_value,protocol_id' keyset cursor, returning None if it is missing or malformed"""
+    try:
+        value, protocol_id = cursor.split(',')
+        return float(value), int(protocol_id)
+    except (AttributeError, ValueError):
+        return None
+
+# Categories are written when the database is seeded and when scoring refreshes their
+# revenue multiples, so every view reuses one snapshot of them for up to CATEGORY_CACHE_TTL
+# seconds; each worker process keeps its own snapshot
+CATEGORY_CACHE_TTL = 300
+_category_cache = {'rows': None, 'expires_at': 0.0}
+_category_averages_cache = {'rows': None, 'expires_at': 0.0}
+
+def get_categories():
+    """Get all categories as plain rows, cached for CATEGORY_CACHE_TTL seconds"""
+    now = time.monotonic()
+    if _category_cache['rows'] is None or now >= _category_cache['expires_at']:
+        # Plain rows stay readable after the request's session is closed, unlike ORM instances
+        _category_cache['rows'] = db.session.query(
+            Category.id,
+            Category.name,
+            Category.description,
+            Category.avg_revenue_multiple,
+            Category.avg_annual_revenue
+        ).all()
+        _category_cache['expires_at'] = now + CATEGORY_CACHE_TTL
+    return _category_cache['rows']
+
+def get_category_averages():
+    """Get protocol counts and average scores per category, cached for CATEGORY_CACHE_TTL seconds"""
+    now = time.monotonic()
+    if _category_averages_cache['rows'] is None or now >= _category_averages_cache['expires_at']:
+        # Average scores for every category in a single grouped query
+        _category_averages_cache['rows'] = {
+            row.category: row
+            for row in db.session.query(
+                Protocol.category,
+                func.count(Protocol.id).label('protocol_count'),
+                func.avg(Score.earnings_quality_score).label('avg_eqs'),
+                func.avg(Score.user_growth_score).label('avg_ugs'),
+                func.avg(Score.fair_value_score).label('avg_fvs'),
+                func.avg(Score.safety_score).label('avg_ss'),
+                func.avg(Score.how3_score).label('avg_how3')
+            ).join(Score, Protocol.id == Score.protocol_id)
+            .group_by(Protocol.category)
             .all()
+        }
+        _category_averages_cache['expires_at'] = now + CATEGORY_CACHE_TTL
+    return _category_averages_cache['rows']
+
+def clear_category_caches():
+    """Drop this worker's category snapshots, e.g. after its own data update"""
+    _category_cache['expires_at'] = 0.0
+    _category_averages_cache['expires_at'] = 0.0
+
+def stream_json_array(items):
+    """Stream dicts as a JSON array response, serializing one element at a time"""
+    def generate():
+        yield '['
+        for i, item in enumerate(items):
+            yield (',' if i else '') + current_app.json.dumps(item, separators=(",", ":"))
+        yield ']'
+    
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/json')
+
+def index():
+    """Home page with top protocols by How3 score"""
+    top_protocols = db.session.query(Protocol, Score) \
+        .join(Score, Protocol.id == Score.protocol_id) \
+        .order_by(desc(Score.how3_score)) \
+        .limit(10) \
+        .all()
         
-        return render_template('protocol.html',
-                              protocol=protocol,
-                              score=score,
-                              revenue_data=revenue_data,
-                              user_data=user_data,
-                              category_peers=category_peers)
-    
-    @app.route('/categories')
-    def categories():
-        """View all protocol categories with average scores"""
-        categories = Category.query.all()
+    categories = get_categories()
+    
+    # Top protocol and protocol count for every category, ranked in a single query
+    rn = func.row_number().over(
+        partition_by=Protocol.category,
+        order_by=desc(Score.how3_score)
+    ).label('rn')
+    protocol_count = func.count().over(partition_by=Protocol.category).label('protocol_count')
+    ranked = db.session.query(Protocol.category, Protocol.name, Score.how3_score, protocol_count, rn) \
+        .join(Score, Protocol.id == Score.protocol_id) \
+        .subquery()
+    category_leaders = {
+        row.category: row
+        for row in db.session.query(ranked).filter(ranked.c.rn == 1).all()
+    }
+    
+    return render_template('index.html', 
+                          protocols=top_protocols,
+                          categories=categories,
+                          category_leaders=category_leaders)
+
+def protocols():
+    """List all protocols with their scores"""
+    category_filter = request.args.get('category')
+    sort_by = request.args.get('sort_by', 'how3_score')
+    sort_order = request.args.get('sort_order', 'desc')
+    
+    query = db.session.query(Protocol, Score) \
+        .join(Score, Protocol.id == Score.protocol_id)
         
-        category_data = []
-        for category in categories:
-            # Calculate average scores for each category
-            protocols = db.session.query(Protocol, Score) \
-                .join(Score, Protocol.id == Score.protocol_id) \
-                .filter(Protocol.category == category.name) \
+    if category_filter:
+        query = query.filter(Protocol.category == category_filter)
+    
+    # Apply sorting, defaulting to how3_score for unknown columns; protocol id breaks ties
+    # so the keyset cursor identifies a unique position. NULL scores sort as
+    # NULL_SCORE_SORT_VALUE so the cursor comparison can reach them.
+    sort_column = SORT_COLUMNS.get(sort_by, Score.how3_score)
+    sort_key = func.coalesce(sort_column, NULL_SCORE_SORT_VALUE)
+    if sort_order == 'desc':
+        query = query.order_by(desc(sort_key), desc(Protocol.id))
+    else:
+        query = query.order_by(sort_key, Protocol.id)
+    
+    # Keyset pagination: continue after the last row of the previous page rather than
+    # using OFFSET, which would scan and discard every earlier row
+    cursor = parse_cursor(request.args.get('after'))
+    if cursor is not None:
+        position = tuple_(sort_key, Protocol.id)
+        query = query.filter(position < cursor if sort_order == 'desc' else position > cursor)
+    
+    # One extra row tells whether there is a next page
+    protocols = query.limit(PROTOCOLS_PER_PAGE + 1).all()
+    next_cursor = None
+    if len(protocols) > PROTOCOLS_PER_PAGE:
+        protocols = protocols[:PROTOCOLS_PER_PAGE]
+        last_protocol, last_score = protocols[-1]
+        last_value = getattr(last_score, sort_column.key)
+        if last_value is None:
+            last_value = NULL_SCORE_SORT_VALUE
+        next_cursor = f"{last_value},{last_protocol.id}"
+    
+    categories = get_categories()
+    
+    return render_template('protocols.html',
+                          protocols=protocols,
+                          categories=categories,
+                          selected_category=category_filter,
+                          sort_by=sort_by,
+                          sort_order=sort_order,
+                          next_cursor=next_cursor)
+
+def protocol_detail(protocol_id):
+    """Detailed view for a specific protocol"""
+    # Protocol and its latest score in one round-trip
+    row = db.session.query(Protocol, Score) \
+        .outerjoin(Score, Score.protocol_id == Protocol.id) \
+        .filter(Protocol.id == protocol_id) \
+        .order_by(desc(Score.timestamp)) \
+        .first()
+    if row is None:
+        abort(404)
+    protocol, score = row
+    
+    # Revenue and user history are not queried here: the page's charts load them
+    # from the /api/protocol/<id>/*-history endpoints
+    
+    # Get category peers for comparison
+    category_peers = db.session.query(Protocol, Score) \
+        .join(Score, Protocol.id == Score.protocol_id) \
+        .filter(Protocol.category == protocol.category) \
+        .filter(Protocol.id != protocol_id) \
+        .order_by(desc(Score.how3_score)) \
+        .limit(5) \
+        .all()
+    
+    return render_template('protocol.html',
+                          protocol=protocol,
+                          score=score,
+                          category_peers=category_peers)
+
+def compare_protocols():
+    """Side-by-side comparison of selected protocols"""
+    raw_ids = request.args.getlist('ids[]') or request.args.get('ids', '').split(',')
+    protocol_ids = list(dict.fromkeys(int(pid) for pid in raw_ids if pid.strip().isdigit()))
+    
+    # Fetch every selected protocol with its score in a single IN query
+    rows = {}
+    if protocol_ids:
+        rows = {
+            protocol.id: (protocol, score)
+            for protocol, score in db.session.query(Protocol, Score)
+                .join(Score, Protocol.id == Score.protocol_id)
+                .filter(Protocol.id.in_(protocol_ids))
                 .all()
-                
-            if protocols:
-                avg_eqs = sum(score.earnings_quality_score for _, score in protocols) / len(protocols)
-                avg_ugs = sum(score.user_growth_score for _, score in protocols) / len(protocols)
-                avg_fvs = sum(score.fair_value_score for _, score in protocols) / len(protocols)
-                avg_ss = sum(score.safety_score for _, score in protocols) / len(protocols)
-                avg_how3 = sum(score.how3_score for _, score in protocols) / len(protocols)
-                
-                category_data.append({
-                    'category': category,
-                    'protocol_count': len(protocols),
-                    'avg_eqs': avg_eqs,
-                    'avg_ugs': avg_ugs,
-                    'avg_fvs': avg_fvs,
-                    'avg_ss': avg_ss,
-                    'avg_how3': avg_how3
-                })
-            else:
-                category_data.append({
-                    'category': category,
-                    'protocol_count': 0,
-                    'avg_eqs': 0,
-                    'avg_ugs': 0,
-                    'avg_fvs': 0,
-                    'avg_ss': 0,
-                    'avg_how3': 0
-                })
-        
-        return render_template('categories.html', category_data=category_data)
-    
-    @app.route('/about')
-    def about():
-        """About page with methodology explanation"""
-        return render_template('about.html')
-    
-    # API endpoint for chart data
-    @app.route('/api/protocol/<int:protocol_id>/revenue-history')
-    def api_revenue_history(protocol_id):
-        """API endpoint for protocol revenue history"""
-        protocol = Protocol.query.get_or_404(protocol_id)
+        }
+    
+    protocols_data = []
+    for protocol_id in protocol_ids:
+        if protocol_id not in rows:
+            continue
+        protocol, score = rows[protocol_id]
+        protocols_data.append({
+            'protocol': protocol,
+            'score': {
+                'eqs': score.earnings_quality_score,
+                'ugs': score.user_growth_score,
+                'fvs': score.fair_value_score,
+                'ss': score.safety_score,
+                'how3_score': score.how3_score
+            }
+        })
+    
+    all_protocols = Protocol.query.order_by(Protocol.name).all()
+    
+    return render_template('compare.html',
+                          protocols_data=protocols_data,
+                          all_protocols=all_protocols)
+
+def categories():
+    """View all protocol categories with average scores"""
+    categories = get_categories()
+    averages = get_category_averages()
+    
+    category_data = []
+    for category in categories:
+        row = averages.get(category.name)
+        category_data.append({
+            'category': category,
+            'protocol_count': row.protocol_count if row else 0,
+            'avg_eqs': row.avg_eqs if row else 0,
+            'avg_ugs': row.avg_ugs if row else 0,
+            'avg_fvs': row.avg_fvs if row else 0,
+            'avg_ss': row.avg_ss if row else 0,
+            'avg_how3': row.avg_how3 if row else 0
+        })
+    
+    return render_template('categories.html', category_data=category_data)
+
+def about():
+    """About page with methodology explanation"""
+    return render_template('about.html')
+
+# API endpoint for chart data
+def api_revenue_history(protocol_id):
+    """API endpoint for protocol revenue history"""
+    if not protocol_exists(protocol_id):
+        abort(404)
+    
+    # Select just the charted columns as plain rows rather than hydrating RevenueData objects
+    revenue_data = db.session.query(
+            RevenueData.month,
+            RevenueData.revenue,
+            RevenueData.revenue_source
+        ).filter(RevenueData.protocol_id == protocol_id) \
+        .order_by(RevenueData.month) \
+        .all()
         
-        revenue_data = RevenueData.query.filter_by(protocol_id=protocol_id) \
-            .order_by(RevenueData.month) \
-            .all()
-            
-        data = [{
-            'month': rd.month.strftime('%Y-%m'),
-            'revenue': rd.revenue,
-            'source': rd.revenue_source
-        } for rd in revenue_data]
+    data = [{
+        'month': rd.month.strftime('%Y-%m'),
+        'revenue': rd.revenue,
+        'source': rd.revenue_source
+    } for rd in revenue_data]
+    
+    return jsonify(data)
+
+def api_user_history(protocol_id):
+    """API endpoint for protocol user history"""
+    if not protocol_exists(protocol_id):
+        abort(404)
+    
+    # Select just the charted columns as plain rows rather than hydrating UserData objects
+    user_data = db.session.query(
+            UserData.month,
+            UserData.active_addresses,
+            UserData.transaction_count,
+            UserData.transaction_volume,
+            UserData.active_address_growth,
+            UserData.transaction_count_growth,
+            UserData.transaction_volume_growth,
+            UserData.active_address_percentile,
+            UserData.transaction_count_percentile,
+            UserData.transaction_volume_percentile
+        ).filter(UserData.protocol_id == protocol_id) \
+        .order_by(UserData.month) \
+        .yield_per(500)
         
-        return jsonify(data)
+    # Rows are fetched in batches of 500 and written out as they are serialized,
+    # so memory stays bounded by the batch rather than the full history
+    data = ({
+        'month': ud.month.strftime('%Y-%m'),
+        'active_addresses': ud.active_addresses,
+        'transaction_count': ud.transaction_count,
+        'transaction_volume': ud.transaction_volume,
+        'active_address_growth': ud.active_address_growth,
+        'transaction_count_growth': ud.transaction_count_growth,
+        'transaction_volume_growth': ud.transaction_volume_growth,
+        'active_address_percentile': ud.active_address_percentile,
+        'transaction_count_percentile': ud.transaction_count_percentile,
+        'transaction_volume_percentile': ud.transaction_volume_percentile
+    } for ud in user_data)
     
-    @app.route('/api/protocol/<int:protocol_id>/user-history')
-    def api_user_history(protocol_id):
-        """API endpoint for protocol user history"""
-        protocol = Protocol.query.get_or_404(protocol_id)
+    return stream_json_array(data)
+
+# Manual update trigger endpoint (can be protected by auth in production)
+def admin_update_data():
+    """Manually trigger data updates"""
+    try:
+        protocol_id = request.form.get('protocol_id')
         
-        user_data = UserData.query.filter_by(protocol_id=protocol_id) \
-            .order_by(UserData.month) \
-            .all()
-            
-        data = [{
-            'month': ud.month.strftime('%Y-%m'),
-            'active_addresses': ud.active_addresses,
-            'transaction_count': ud.transaction_count,
-            'transaction_volume': ud.transaction_volume,
-            'active_address_growth': ud.active_address_growth,
-            'transaction_count_growth': ud.transaction_count_growth,
-            'transaction_volume_growth': ud.transaction_volume_growth,
-            'active_address_percentile': ud.active_address_percentile,
-            'transaction_count_percentile': ud.transaction_count_percentile,
-            'transaction_volume_percentile': ud.transaction_volume_percentile
-        } for ud in user_data]
+        data_processor = DataProcessor()
+        score_calculator = ScoreCalculator()
         
-        return jsonify(data)
-    
-    # Manual update trigger endpoint (can be protected by auth in production)
-    @app.route('/admin/update-data', methods=['POST'])
-    def admin_update_data():
-        """Manually trigger data updates"""
-        try:
-            protocol_id = request.form.get('protocol_id')
+        if protocol_id:
+            protocol = Protocol.query.get_or_404(int(protocol_id))
             
-            data_processor = DataProcessor()
-            score_calculator = ScoreCalculator()
+            success_revenue = data_processor.process_revenue_data(protocol.name)
+            success_user = data_processor.process_user_data(protocol.name)
             
-            if protocol_id:
-                protocol = Protocol.query.get_or_404(int(protocol_id))
-                
-                success_revenue = data_processor.process_revenue_data(protocol.name)
-                success_user = data_processor.process_user_data(protocol.name)
-                
-                if success_revenue and success_user:
-                    score_calculator.calculate_protocol_scores(protocol_id=protocol.id)
-                    flash(f"Successfully updated data for {protocol.name}", "success")
-                else:
-                    flash(f"Error updating data for {protocol.name}", "danger")
+            if success_revenue and success_user:
+                score_calculator.calculate_protocol_scores(protocol_id=protocol.id)
+                flash(f"Successfully updated data for {protocol.name}", "success")
             else:
-                # Update all protocols
-                success_count = data_processor.update_all_protocols()
-                score_calculator.calculate_protocol_scores()
-                flash(f"Successfully updated data for {success_count} protocols", "success")
-            
-            return redirect(request.referrer or url_for('index'))
-            
-        except Exception as e:
-            logger.error(f"Error in admin update: {str(e)}")
-            flash(f"Error: {str(e)}", "danger")
-            return redirect(request.referrer or url_for('index'))
+                flash(f"Error updating data for {protocol.name}", "danger")
+        else:
+            # Update all protocols
+            success_count = data_processor.update_all_protocols()
+            score_calculator.calculate_protocol_scores()
+            flash(f"Successfully updated data for {success_count} protocols", "success")
+        
+        clear_category_caches()
+        return redirect(request.referrer or url_for('index'))
+        
+    except Exception as e:
+        logger.error(f"Error in admin update: {str(e)}")
+        flash(f"Error: {str(e)}", "danger")
+        return redirect(request.referrer or url_for('index'))
+
+def register_routes(app):
+    """Register all routes with the Flask app"""
+    app.add_url_rule('/', view_func=index)
+    app.add_url_rule('/protocols', view_func=protocols)
+    app.add_url_rule('/protocol/<int:protocol_id>', view_func=protocol_detail)
+    app.add_url_rule('/compare', view_func=compare_protocols)
+    app.add_url_rule('/categories', view_func=categories)
+    app.add_url_rule('/about', view_func=about)
+    app.add_url_rule('/api/protocol/<int:protocol_id>/revenue-history', view_func=api_revenue_history)
+    app.add_url_rule('/api/protocol/<int:protocol_id>/user-history', view_func=api_user_history)
+    app.add_url_rule('/admin/update-data', view_func=admin_update_data, methods=['POST'])
@@ -4,12 +4,17 @@ with adjustments from the configuration file.
 """
 
 import argparse
+import functools
+import itertools
 import logging
+import os
+import numpy as np
 import pandas as pd
 import json
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dune_client import DuneClient
 from centralized_processor import CentralizedProcessor
+from utils import write_csv
 
 # Configure logging
 logging.basicConfig(
@@ -22,6 +27,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=1)
+def _get_processor():
+    """Get the shared CentralizedProcessor, loading protocol_config.json only on first use."""
+    return CentralizedProcessor()
+
 def run_protocol_scoring(protocol_name, use_real_data=False):
     """
     Run protocol-specific scoring using the centralized processor.
@@ -33,7 +43,7 @@ def run_protocol_scoring(protocol_name, use_real_data=False):
     Returns:
         dict: Protocol scoring report
     """
-    processor = CentralizedProcessor()
+    processor = _get_processor()
     
     # Get protocol configuration
     protocol_config = processor.get_protocol_config(protocol_name)
@@ -70,7 +80,7 @@ def run_protocol_scoring(protocol_name, use_real_data=False):
         
         # Save adjusted data to CSV for transparency
         adjusted_df = processor.apply_revenue_adjustments(df, protocol_name)
-        adjusted_df.to_csv(f"scores/{protocol_name}_adjusted_data.csv", index=False)
+        write_csv(adjusted_df, f"scores/{protocol_name}_adjusted_data.csv")
         
         return report
     
@@ -132,55 +142,59 @@ def get_sample_data(protocol_name):
 
 def create_chainlink_sample_data():
     """Create a DataFrame based on the sample Chainlink data from Dune."""
-    # Data based on the eqs-chainlink sampledune.txt file
-    data = [
-        # First month (April 2024)
-        {'month': datetime(2024, 4, 1), 'source': 'automation', 'total_fees': 67939.46084758072, 'mom_change': None, 
-         'avg_mom_change': -0.08008760931758903, 'stddev_mom_change': 0.5116151413977408, 'num_months': 13},
-        {'month': datetime(2024, 4, 1), 'source': 'ccip', 'total_fees': 98848.54011158487, 'mom_change': None, 
-         'avg_mom_change': 0.009141157048100923, 'stddev_mom_change': 0.6596989982341107, 'num_months': 13},
-        {'month': datetime(2024, 4, 1), 'source': 'fm', 'total_fees': 2219711.501320376, 'mom_change': None, 
-         'avg_mom_change': -0.20989551767904832, 'stddev_mom_change': 0.4108114361781297, 'num_months': 13},
-        {'month': datetime(2024, 4, 1), 'source': 'ocr', 'total_fees': 3395286.256855447, 'mom_change': None, 
-         'avg_mom_change': -0.22781204525964827, 'stddev_mom_change': 0.421958290453829, 'num_months': 13},
-        {'month': datetime(2024, 4, 1), 'source': 'vrf', 'total_fees': 31244.752470117477, 'mom_change': None, 
-         'avg_mom_change': -0.2036716821229518, 'stddev_mom_change': 0.3310369401263438, 'num_months': 13},
-        
-        # Second month (May 2024)
-        {'month': datetime(2024, 5, 1), 'source': 'automation', 'total_fees': 65326.42687327729, 'mom_change': -0.03846121152132275, 
-         'avg_mom_change': -0.08008760931758903, 'stddev_mom_change': 0.5116151413977408, 'num_months': 13},
-        {'month': datetime(2024, 5, 1), 'source': 'ccip', 'total_fees': 75257.5047921389, 'mom_change': -0.23865840904494182, 
-         'avg_mom_change': 0.009141157048100923, 'stddev_mom_change': 0.6596989982341107, 'num_months': 13},
-        {'month': datetime(2024, 5, 1), 'source': 'fm', 'total_fees': 2199732.3881992646, 'mom_change': -0.009000770194336972, 
-         'avg_mom_change': -0.20989551767904832, 'stddev_mom_change': 0.4108114361781297, 'num_months': 13},
-        {'month': datetime(2024, 5, 1), 'source': 'ocr', 'total_fees': 3152587.491741491, 'mom_change': -0.0714810907692749, 
-         'avg_mom_change': -0.22781204525964827, 'stddev_mom_change': 0.421958290453829, 'num_months': 13},
-        {'month': datetime(2024, 5, 1), 'source': 'vrf', 'total_fees': 20580.17782983342, 'mom_change': -0.3413237038918349, 
-         'avg_mom_change': -0.2036716821229518, 'stddev_mom_change': 0.3310369401263438, 'num_months': 13}
-    ]
+    # Data based on the eqs-chainlink sampledune.txt file, as parallel typed columns
+    # (April 2024 for all five sources, then May 2024)
+    sources = ['automation', 'ccip', 'fm', 'ocr', 'vrf']
+    avg_mom_change = [-0.08008760931758903, 0.009141157048100923, -0.20989551767904832,
+                      -0.22781204525964827, -0.2036716821229518]
+    stddev_mom_change = [0.5116151413977408, 0.6596989982341107, 0.4108114361781297,
+                         0.421958290453829, 0.3310369401263438]
     
-    # Convert to DataFrame
-    df = pd.DataFrame(data)
+    df = pd.DataFrame({
+        'month': np.repeat(np.array(['2024-04-01', '2024-05-01'], dtype='datetime64[ns]'), len(sources)),
+        'source': sources * 2,
+        'total_fees': np.array([
+            67939.46084758072, 98848.54011158487, 2219711.501320376, 3395286.256855447, 31244.752470117477,
+            65326.42687327729, 75257.5047921389, 2199732.3881992646, 3152587.491741491, 20580.17782983342
+        ], dtype=np.float64),
+        'mom_change': np.array([
+            np.nan, np.nan, np.nan, np.nan, np.nan,
+            -0.03846121152132275, -0.23865840904494182, -0.009000770194336972, -0.0714810907692749, -0.3413237038918349
+        ], dtype=np.float64),
+        'avg_mom_change': np.array(avg_mom_change * 2, dtype=np.float64),
+        'stddev_mom_change': np.array(stddev_mom_change * 2, dtype=np.float64),
+        'num_months': np.full(2 * len(sources), 13, dtype=np.int64)
+    })
     return df
 
 def main():
     """Main entry point for the script."""
     parser = argparse.ArgumentParser(description="Run centralized scoring for protocols.")
-    parser.add_argument("protocol", help="Protocol name (e.g., chainlink)")
+    parser.add_argument("protocols", nargs="+", help="Protocol names (e.g., chainlink uniswap)")
     parser.add_argument("--real-data", action="store_true", help="Use real data from Dune")
     args = parser.parse_args()
     
     # Ensure the scores directory exists
-    import os
     os.makedirs("scores", exist_ok=True)
     
     # Run scoring
-    report = run_protocol_scoring(args.protocol, args.real_data)
-    
-    if report:
-        logger.info(f"Successfully generated report for {args.protocol}")
+    if len(args.protocols) == 1:
+        reports = [run_protocol_scoring(args.protocols[0], args.real_data)]
     else:
-        logger.error(f"Failed to generate report for {args.protocol}")
+        # Real data runs wait on Dune HTTP calls, so threads overlap them; sample data runs are
+        # CPU-bound pandas work and get separate processes
+        if args.real_data:
+            executor = ThreadPoolExecutor(max_workers=len(args.protocols))
+        else:
+            executor = ProcessPoolExecutor(max_workers=min(len(args.protocols), os.cpu_count() or 1))
+        with executor:
+            reports = list(executor.map(run_protocol_scoring, args.protocols, itertools.repeat(args.real_data)))
+    
+    for protocol, report in zip(args.protocols, reports):
+        if report:
+            logger.info(f"Successfully generated report for {protocol}")
+        else:
+            logger.error(f"Failed to generate report for {protocol}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
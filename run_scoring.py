@@ -11,6 +11,12 @@ import pandas as pd
 from datetime import datetime
 from dune_processor import DuneProcessor
 from protocol_config import PROTOCOL_CONFIGS, CATEGORY_SETTINGS, SCORE_WEIGHTS
+from utils import write_csv
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Set up logging
 logging.basicConfig(
@@ -62,6 +68,15 @@ def setup_arg_parser():
     
     return parser
 
+def write_json(obj, path):
+    """Write scores to an indented JSON file, using orjson's C encoder when available"""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(path, 'w') as f:
+            json.dump(obj, f, indent=2)
+
 def save_results(protocol_name, data, scores, output_dir, format_type):
     """Save results to file(s)"""
     # Create output directory if it doesn't exist
@@ -74,13 +89,12 @@ def save_results(protocol_name, data, scores, output_dir, format_type):
     # Save scores
     if format_type in ['json', 'both']:
         score_file = os.path.join(output_dir, f"{base_filename}_scores.json")
-        with open(score_file, 'w') as f:
-            json.dump(scores, f, indent=2)
+        write_json(scores, score_file)
         logger.info(f"Saved scores to {score_file}")
     
     if format_type in ['csv', 'both']:
         score_file = os.path.join(output_dir, f"{base_filename}_scores.csv")
-        pd.DataFrame([scores]).to_csv(score_file, index=False)
+        write_csv(pd.DataFrame([scores]), score_file)
         logger.info(f"Saved scores to {score_file}")
     
     # Save raw data for each query type
@@ -88,7 +102,7 @@ def save_results(protocol_name, data, scores, output_dir, format_type):
         if not df.empty:
             if format_type in ['csv', 'both']:
                 data_file = os.path.join(output_dir, f"{base_filename}_{query_type}_data.csv")
-                df.to_csv(data_file, index=False)
+                write_csv(df, data_file)
                 logger.info(f"Saved {query_type} data to {data_file}")
             
             if format_type in ['json', 'both']:
@@ -160,8 +174,7 @@ def main():
         
         if args.format in ['json', 'both']:
             combined_file = os.path.join(args.output, f"all_protocols_{timestamp}.json")
-            with open(combined_file, 'w') as f:
-                json.dump(all_scores, f, indent=2)
+            write_json(all_scores, combined_file)
             logger.info(f"Saved combined scores to {combined_file}")
         
         if args.format in ['csv', 'both']:
@@ -176,7 +189,7 @@ def main():
                 rows.append(row)
             
             combined_file = os.path.join(args.output, f"all_protocols_{timestamp}.csv")
-            pd.DataFrame(rows).to_csv(combined_file, index=False)
+            write_csv(pd.DataFrame(rows), combined_file)
             logger.info(f"Saved combined scores to {combined_file}")
     
     logger.info("Processing complete")
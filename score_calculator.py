@@ -1,15 +1,49 @@
 import numpy as np
+import pandas as pd
 import logging
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, insert, select, update
 from app import db
 from models import Protocol, RevenueData, UserData, Score, Category
 from config import get_config
-from utils import normalize_score, calculate_percentile_rank
 from certik_client import CertikClient
 
 logger = logging.getLogger(__name__)
 
+# UserData columns loaded for the User Growth Score, in active address / tx count / tx volume order
+USER_METRIC_COLUMNS = [UserData.active_addresses, UserData.transaction_count, UserData.transaction_volume]
+USER_GROWTH_COLUMNS = [
+    UserData.active_address_growth, UserData.transaction_count_growth, UserData.transaction_volume_growth
+]
+USER_PERCENTILE_COLUMNS = [
+    UserData.active_address_percentile, UserData.transaction_count_percentile, UserData.transaction_volume_percentile
+]
+
+def bulk_save_scores(rows):
+    """
+    Create or update Score records in bulk.
+    
+    Parameters:
+    rows (list): Dicts with protocol_id and the Score columns to write
+    """
+    if not rows:
+        return
+    
+    # Find existing score records for these protocols in a single query
+    protocol_ids = [row['protocol_id'] for row in rows]
+    existing_ids = dict(db.session.execute(
+        select(Score.protocol_id, Score.id).where(Score.protocol_id.in_(protocol_ids))
+    ).all())
+    
+    updates = [{'id': existing_ids[row['protocol_id']], **row} for row in rows if row['protocol_id'] in existing_ids]
+    inserts = [row for row in rows if row['protocol_id'] not in existing_ids]
+    
+    # Core bulk statements: one executemany per kind instead of ORM unit-of-work per row
+    if updates:
+        db.session.execute(update(Score), updates)
+    if inserts:
+        db.session.execute(insert(Score), inserts)
+
 class ScoreCalculator:
     """Class for calculating standardized scores for protocols"""
     
@@ -33,50 +67,35 @@ class ScoreCalculator:
     def calculate_protocol_scores(self, protocol_id=None):
         """Calculate scores for a specific protocol or all protocols"""
         try:
+            protocol_query = select(
+                Protocol.id, Protocol.name, Protocol.category, Protocol.market_cap, Protocol.annual_revenue
+            )
             if protocol_id:
-                protocols = [Protocol.query.get(protocol_id)]
-                if not protocols[0]:
-                    logger.error(f"Protocol with ID {protocol_id} not found")
-                    return False
-            else:
-                protocols = Protocol.query.all()
-            
-            for protocol in protocols:
-                eqs = self._calculate_eqs(protocol)
-                ugs = self._calculate_ugs(protocol)
-                fvs = self._calculate_fvs(protocol)
-                ss = self._get_safety_score(protocol)
-                
-                # Calculate combined How3 score
-                how3_score = float(
-                    self.eqs_weight * eqs + 
-                    self.ugs_weight * ugs + 
-                    self.fvs_weight * fvs + 
-                    self.ss_weight * ss
-                )
-                
-                # Create or update score record
-                existing_score = Score.query.filter_by(protocol_id=protocol.id).first()
-                
-                if existing_score:
-                    existing_score.earnings_quality_score = float(eqs)
-                    existing_score.user_growth_score = float(ugs)
-                    existing_score.fair_value_score = float(fvs)
-                    existing_score.safety_score = float(ss)
-                    existing_score.how3_score = float(how3_score)
-                    existing_score.timestamp = datetime.utcnow()
-                else:
-                    new_score = Score(
-                        protocol_id=protocol.id,
-                        earnings_quality_score=float(eqs),
-                        user_growth_score=float(ugs),
-                        fair_value_score=float(fvs),
-                        safety_score=float(ss),
-                        how3_score=float(how3_score),
-                        timestamp=datetime.utcnow()
-                    )
-                    db.session.add(new_score)
+                protocol_query = protocol_query.where(Protocol.id == protocol_id)
+            protocols = pd.read_sql(protocol_query, db.session.connection(), index_col='id')
+            
+            if protocol_id and protocols.empty:
+                logger.error(f"Protocol with ID {protocol_id} not found")
+                return False
+            
+            # Component scores for every protocol at once, as Series indexed by protocol id
+            scores = pd.DataFrame({
+                'earnings_quality_score': self._calculate_eqs(protocols),
+                'user_growth_score': self._calculate_ugs(protocols),
+                'fair_value_score': self._calculate_fvs(protocols),
+                'safety_score': [self._get_safety_score(protocol) for protocol in protocols.itertuples()]
+            }, index=protocols.index).astype(float)
+            
+            # Calculate combined How3 score
+            scores['how3_score'] = (
+                self.eqs_weight * scores['earnings_quality_score'] + 
+                self.ugs_weight * scores['user_growth_score'] + 
+                self.fvs_weight * scores['fair_value_score'] + 
+                self.ss_weight * scores['safety_score']
+            )
+            scores['timestamp'] = datetime.utcnow()
             
+            bulk_save_scores(scores.rename_axis('protocol_id').reset_index().to_dict(orient='records'))
             db.session.commit()
             return True
             
@@ -85,54 +104,49 @@ class ScoreCalculator:
             logger.error(f"Error calculating scores: {str(e)}")
             return False
     
-    def _calculate_eqs(self, protocol):
-        """Calculate Earnings Quality Score for a protocol"""
+    def _calculate_eqs(self, protocols):
+        """Calculate Earnings Quality Scores for a frame of protocols"""
         try:
-            # Get last 6 months of revenue data
+            # Get last 6 months of revenue data for all protocols in one query
             end_date = datetime.utcnow().date()
             start_date = end_date - timedelta(days=180)
             
-            revenue_data = RevenueData.query.filter(
-                RevenueData.protocol_id == protocol.id,
-                RevenueData.month >= start_date,
-                RevenueData.month <= end_date
-            ).order_by(RevenueData.month).all()
+            revenue_data = pd.read_sql(
+                select(RevenueData.protocol_id, RevenueData.stability_score, RevenueData.magnitude_score)
+                .where(
+                    RevenueData.protocol_id.in_(protocols.index.tolist()),
+                    RevenueData.month >= start_date,
+                    RevenueData.month <= end_date
+                )
+                .order_by(RevenueData.protocol_id, RevenueData.month, RevenueData.id),
+                db.session.connection()
+            )
+            grouped = revenue_data.groupby('protocol_id')
             
-            if not revenue_data or len(revenue_data) < 2:
-                logger.warning(f"Insufficient revenue data for {protocol.name}")
-                return 0
+            sufficient = grouped.size().reindex(protocols.index, fill_value=0) >= 2
+            for name in protocols.loc[~sufficient, 'name']:
+                logger.warning(f"Insufficient revenue data for {name}")
             
             # Calculate stability metric (looking for consistent revenues with low volatility)
-            mom_changes = [rd.stability_score for rd in revenue_data if rd.stability_score is not None]
-            
-            if mom_changes:
-                # Convert to numpy array for calculations
-                mom_changes = np.array(mom_changes)
-                
-                # Calculate coefficient of variation (lower is better for stability)
-                # To handle negative values, we'll use a modified approach
-                mean_change = np.mean(mom_changes)
-                std_change = np.std(mom_changes)
-                
-                # Smaller standard deviation relative to mean indicates more stability
-                # We'll use inverse of variability as our raw stability score
-                # Adding a small constant to avoid division by zero
-                variability = std_change / (abs(mean_change) + 0.01)
-                stability_raw = 1 / (1 + variability)
-                
-                # Normalize: Higher value = more stable
-                stability_score = normalize_score(stability_raw, 0, 1)
-                
-                # Adjust stability score based on trend direction
-                # Positive average MoM change should increase the score
-                trend_factor = normalize_score(mean_change, -0.5, 0.5)  # Normalize growth rate
-                stability_score = 0.7 * stability_score + 0.3 * (trend_factor + 0.5)  # Weighted average, shift to 0-1 range
-            else:
-                stability_score = 0
+            mom_changes = grouped['stability_score']
+            mean_change = mom_changes.mean()
+            std_change = mom_changes.std(ddof=0)
+            
+            # Smaller standard deviation relative to mean indicates more stability
+            # We'll use inverse of variability as our raw stability score
+            # Adding a small constant to avoid division by zero
+            variability = std_change / (mean_change.abs() + 0.01)
+            stability_score = (1 / (1 + variability)).clip(0, 1)
+            
+            # Adjust stability score based on trend direction
+            # Positive average MoM change should increase the score
+            trend_factor = (mean_change + 0.5).clip(0, 1)  # Normalize growth rate from [-0.5, 0.5]
+            stability_score = 0.7 * stability_score + 0.3 * (trend_factor + 0.5)  # Weighted average, shift to 0-1 range
+            stability_score = stability_score.where(mom_changes.count() > 0, 0)
             
             # Get magnitude score (already calculated relative to category peers)
-            latest_data = revenue_data[-1] if revenue_data else None
-            magnitude_score = latest_data.magnitude_score if latest_data and latest_data.magnitude_score else 0
+            latest_data = revenue_data.drop_duplicates('protocol_id', keep='last').set_index('protocol_id')
+            magnitude_score = latest_data['magnitude_score'].fillna(0)
             
             # Combined EQS using weighted average
             eqs = (
@@ -140,79 +154,70 @@ class ScoreCalculator:
                 self.rev_magnitude_weight * magnitude_score
             ) * 100  # Scale to 0-100
             
-            return min(max(eqs, 0), 100)  # Ensure score is between 0 and 100
+            eqs = eqs.reindex(protocols.index).clip(0, 100)  # Ensure score is between 0 and 100
+            return eqs.where(sufficient, 0)
             
         except Exception as e:
-            logger.error(f"Error calculating EQS for {protocol.name}: {str(e)}")
-            return 0
+            logger.error(f"Error calculating EQS: {str(e)}")
+            return pd.Series(0.0, index=protocols.index)
     
-    def _calculate_ugs(self, protocol):
-        """Calculate User Growth Score for a protocol"""
+    def _calculate_ugs(self, protocols):
+        """Calculate User Growth Scores for a frame of protocols"""
         try:
-            # Get last 6 months of user data
+            # Get last 6 months of user data for all protocols in one query
             end_date = datetime.utcnow().date()
             start_date = end_date - timedelta(days=180)
             
-            user_data = UserData.query.filter(
-                UserData.protocol_id == protocol.id,
-                UserData.month >= start_date,
-                UserData.month <= end_date
-            ).order_by(UserData.month).all()
-            
-            if not user_data:
-                logger.warning(f"No user data found for {protocol.name}")
-                return 0
+            user_data = pd.read_sql(
+                select(
+                    UserData.protocol_id, *USER_METRIC_COLUMNS, *USER_GROWTH_COLUMNS, *USER_PERCENTILE_COLUMNS
+                )
+                .where(
+                    UserData.protocol_id.in_(protocols.index.tolist()),
+                    UserData.month >= start_date,
+                    UserData.month <= end_date
+                )
+                .order_by(UserData.protocol_id, UserData.month, UserData.id),
+                db.session.connection()
+            )
             
-            # Get the latest user data metrics
-            latest_data = user_data[-1]
+            # Get the latest user data metrics for each protocol
+            latest_data = user_data.drop_duplicates('protocol_id', keep='last').set_index('protocol_id')
+            latest_data = latest_data.reindex(protocols.index)
+            latest_data['category'] = protocols['category']
             
-            # Get protocols in the same category
-            category_protocols = Protocol.query.filter_by(category=protocol.category).all()
-            protocol_ids = [p.id for p in category_protocols]
+            has_data = protocols.index.isin(user_data['protocol_id'])
+            for name in protocols.loc[~has_data, 'name']:
+                logger.warning(f"No user data found for {name}")
             
-            # Get the latest user data for all protocols in the category
+            # Get the latest user data for all protocols in the scored categories
             latest_month = db.session.query(func.max(UserData.month)).scalar()
-            category_data = UserData.query.filter(
-                UserData.protocol_id.in_(protocol_ids),
-                UserData.month == latest_month
-            ).all()
+            category_data = pd.read_sql(
+                select(Protocol.category, *USER_METRIC_COLUMNS)
+                .join(Protocol, UserData.protocol_id == Protocol.id)
+                .where(Protocol.category.in_(protocols['category'].unique().tolist()), UserData.month == latest_month),
+                db.session.connection()
+            )
             
-            if not category_data:
-                logger.warning(f"No category data found for {protocol.category}")
-                return 0
+            has_category_data = latest_data['category'].isin(category_data['category'])
+            for category in protocols.loc[has_data & ~has_category_data, 'category'].unique():
+                logger.warning(f"No category data found for {category}")
             
             # Use percentile ranks if available, otherwise calculate them
-            if latest_data.active_address_percentile and latest_data.transaction_count_percentile and latest_data.transaction_volume_percentile:
-                active_addr_rank = latest_data.active_address_percentile
-                tx_count_rank = latest_data.transaction_count_percentile
-                tx_volume_rank = latest_data.transaction_volume_percentile
-            else:
+            percentile_names = [column.key for column in USER_PERCENTILE_COLUMNS]
+            stored_ranks = latest_data[percentile_names].fillna(0)
+            has_stored_ranks = (stored_ranks != 0).all(axis=1)
+            
+            ranks = []
+            for metric, percentile in zip(USER_METRIC_COLUMNS, percentile_names):
                 # Calculate percentile ranks for each metric as a fallback
-                active_addr_rank = calculate_percentile_rank(
-                    [data.active_addresses for data in category_data],
-                    latest_data.active_addresses
-                )
-                
-                tx_count_rank = calculate_percentile_rank(
-                    [data.transaction_count for data in category_data],
-                    latest_data.transaction_count
-                )
-                
-                tx_volume_rank = calculate_percentile_rank(
-                    [data.transaction_volume for data in category_data],
-                    latest_data.transaction_volume
-                )
+                fallback = self._rank_within_category(latest_data, category_data, metric.key)
+                ranks.append(stored_ranks[percentile].where(has_stored_ranks, fallback))
+            active_addr_rank, tx_count_rank, tx_volume_rank = ranks
             
             # Calculate growth trend factor (positive growth rates are better)
-            growth_factors = []
-            if latest_data.active_address_growth is not None:
-                growth_factors.append(normalize_score(latest_data.active_address_growth, -100, 100))
-            if latest_data.transaction_count_growth is not None:
-                growth_factors.append(normalize_score(latest_data.transaction_count_growth, -100, 100))
-            if latest_data.transaction_volume_growth is not None:
-                growth_factors.append(normalize_score(latest_data.transaction_volume_growth, -100, 100))
-            
-            growth_factor = np.mean(growth_factors) if growth_factors else 0
+            growth_names = [column.key for column in USER_GROWTH_COLUMNS]
+            growth_factor = ((latest_data[growth_names] + 100) / 200).clip(0, 1).mean(axis=1).fillna(0)
             
             # Combined UGS using weighted average of metrics and growth trend
             ugs = (
@@ -224,63 +229,90 @@ class ScoreCalculator:
                 0.3 * growth_factor
             )
             
-            return min(max(ugs * 100, 0), 100)  # Ensure score is between 0 and 100
+            ugs = (ugs * 100).clip(0, 100)  # Ensure score is between 0 and 100
+            return ugs.where(has_data & has_category_data, 0)
             
         except Exception as e:
-            logger.error(f"Error calculating UGS for {protocol.name}: {str(e)}")
-            return 0
+            logger.error(f"Error calculating UGS: {str(e)}")
+            return pd.Series(0.0, index=protocols.index)
+    
+    @staticmethod
+    def _rank_within_category(latest_data, category_data, metric):
+        """Midpoint percentile rank of each protocol's latest metric among its category's latest values"""
+        ranks = pd.Series(0.0, index=latest_data.index)
+        for category, values in category_data.groupby('category')[metric]:
+            values = np.sort(values.dropna().to_numpy(dtype=np.float64))
+            if not len(values):
+                continue
+            
+            members = latest_data.index[latest_data['category'] == category]
+            targets = latest_data.loc[members, metric].to_numpy(dtype=np.float64)
+            
+            # Count values less than and equal to each target
+            count_less = np.searchsorted(values, targets, side='left')
+            count_equal = np.searchsorted(values, targets, side='right') - count_less
+            ranks[members] = np.where(np.isnan(targets), 0, (count_less + 0.5 * count_equal) / len(values))
+        return ranks
     
-    def _calculate_fvs(self, protocol):
-        """Calculate Fair Value Score for a protocol"""
+    def _calculate_fvs(self, protocols):
+        """Calculate Fair Value Scores for a frame of protocols"""
         try:
-            if not protocol.market_cap or not protocol.annual_revenue or protocol.annual_revenue <= 0:
-                logger.warning(f"Missing market cap or revenue data for {protocol.name}")
-                return 0
-            
-            # Calculate P/S ratio (Price to Sales, or Market Cap to Annual Revenue)
-            ps_ratio = protocol.market_cap / protocol.annual_revenue
+            valid = (
+                protocols['market_cap'].fillna(0).ne(0) &
+                protocols['annual_revenue'].gt(0)
+            )
+            for name in protocols.loc[~valid, 'name']:
+                logger.warning(f"Missing market cap or revenue data for {name}")
             
-            # Get category average P/S ratio
-            category = Category.query.filter_by(name=protocol.category).first()
-            category_avg_ps = category.avg_revenue_multiple if category else None
+            valid_protocols = protocols[valid]
             
-            if not category_avg_ps or category_avg_ps <= 0:
-                # If no category average, calculate it from all protocols in the category
-                category_protocols = Protocol.query.filter_by(category=protocol.category).all()
+            # Calculate P/S ratio (Price to Sales, or Market Cap to Annual Revenue)
+            ps_ratio = valid_protocols['market_cap'] / valid_protocols['annual_revenue']
+            
+            # Get category average P/S ratios
+            categories = valid_protocols['category'].unique().tolist()
+            category_rows = pd.read_sql(
+                select(Category.id, Category.name, Category.avg_revenue_multiple).where(Category.name.in_(categories)),
+                db.session.connection(),
+                index_col='name'
+            )
+            category_avg_ps = category_rows['avg_revenue_multiple'].where(lambda avg: avg > 0)
+            
+            # If no category average, use the median ratio of all valid protocols in the category
+            # (median avoids outlier influence), falling back to a reasonable default of 30
+            missing = [category for category in categories if pd.isna(category_avg_ps.get(category))]
+            if missing:
+                peer_ratios = pd.read_sql(
+                    select(Protocol.category, (Protocol.market_cap / Protocol.annual_revenue).label('ps_ratio'))
+                    .where(Protocol.category.in_(missing), Protocol.market_cap != 0, Protocol.annual_revenue > 0),
+                    db.session.connection()
+                )
+                medians = peer_ratios.groupby('category')['ps_ratio'].median()
                 
-                valid_protocols = [p for p in category_protocols 
-                                   if p.market_cap and p.annual_revenue and p.annual_revenue > 0]
+                # Update category averages; written with the scores commit
+                updates = category_rows.loc[category_rows.index.intersection(medians.index), ['id']]
+                if not updates.empty:
+                    updates['avg_revenue_multiple'] = medians
+                    db.session.execute(update(Category), updates.to_dict(orient='records'))
                 
-                if valid_protocols:
-                    ratios = [p.market_cap / p.annual_revenue for p in valid_protocols]
-                    category_avg_ps = np.median(ratios)  # Using median to avoid outlier influence
-                    
-                    # Update category average
-                    if category:
-                        category.avg_revenue_multiple = category_avg_ps
-                        db.session.commit()
-                else:
-                    # Fallback to a reasonable default if no data is available
-                    category_avg_ps = 30
+                category_avg_ps = category_avg_ps.reindex(categories).fillna(medians).fillna(30)
+            
+            avg_ps = valid_protocols['category'].map(category_avg_ps)
+            relative_ps = ps_ratio / avg_ps
             
             # Calculate how undervalued/overvalued the protocol is compared to category average
-            # Lower P/S ratio is better (undervalued)
-            if ps_ratio <= category_avg_ps:
-                # Undervalued or fairly valued
-                value_factor = 1 - (ps_ratio / category_avg_ps)
-            else:
-                # Overvalued
-                overvalued_factor = min((ps_ratio / category_avg_ps) - 1, 10)  # Cap at 10x overvaluation
-                value_factor = -overvalued_factor
+            # Lower P/S ratio is better (undervalued); overvaluation is capped at 10x
+            value_factor = np.where(ps_ratio <= avg_ps, 1 - relative_ps, -np.minimum(relative_ps - 1, 10))
             
             # Normalize to 0-100 scale
-            fvs = normalize_score(value_factor, -10, 1) * 100
+            fvs = ((value_factor + 10) / 11).clip(0, 1) * 100
             
-            return min(max(fvs, 0), 100)  # Ensure score is between 0 and 100
+            fvs = pd.Series(fvs, index=valid_protocols.index).clip(0, 100)  # Ensure score is between 0 and 100
+            return fvs.reindex(protocols.index, fill_value=0)
             
         except Exception as e:
-            logger.error(f"Error calculating FVS for {protocol.name}: {str(e)}")
-            return 0
+            logger.error(f"Error calculating FVS: {str(e)}")
+            return pd.Series(0.0, index=protocols.index)
     
     def _get_safety_score(self, protocol):
         """Get Safety Score from Certik Skynet"""
@@ -12,7 +12,7 @@ def seed_database():
     
     try:
         # Only seed if the database is empty
-        if Protocol.query.count() > 0:
+        if db.session.query(Protocol.query.exists()).scalar():
             logger.info("Database already has protocols, skipping seed")
             return
         
@@ -31,21 +31,29 @@ function createRevenueChart(chartId, data) {
     // Sort data by month (chronological order)
     data.sort((a, b) => new Date(a.month) - new Date(b.month));
     
-    // Extract labels (months) and revenue values
-    const labels = data.map(item => {
-        const date = new Date(item.month);
-        return date.toLocaleDateString('en-US', { month: 'short', year: 'numeric' });
+    // Collect the union of months across every source (already in order), and group
+    // each source's revenue by month, in a single pass
+    const months = new Set();
+    const grouped = new Map();
+    data.forEach(item => {
+        months.add(item.month);
+        let group = grouped.get(item.source);
+        if (!group) {
+            group = new Map();
+            grouped.set(item.source, group);
+        }
+        group.set(item.month, item.revenue);
     });
     
-    // Group data by source
-    const sources = [...new Set(data.map(item => item.source))];
-    const datasets = sources.map(source => {
+    // Label the x-axis with every month; sources without revenue in a month get a gap (null)
+    const labels = Array.from(months, month =>
+        new Date(month).toLocaleDateString('en-US', { month: 'short', year: 'numeric' }));
+    const datasets = Array.from(grouped, ([source, group]) => {
         const color = getColorForSource(source);
-        const sourceData = data.filter(item => item.source === source);
         
         return {
             label: source.charAt(0).toUpperCase() + source.slice(1),
-            data: sourceData.map(item => item.revenue),
+            data: Array.from(months, month => group.has(month) ? group.get(month) : null),
             backgroundColor: color,
             borderColor: color,
             borderWidth: 2
@@ -131,6 +131,36 @@ def test_with_execute_query():
         print(f"Error: {str(e)}")
         return None
 
+def test_with_parameterized_query():
+    """Test executing a builder query with the months passed as a query parameter."""
+    print("\nTesting with a parameterized query...")
+    try:
+        # Use our custom DuneClient 
+        dune = DuneClient()
+        builder = DuneQueryBuilder()
+        
+        # Generate a query using the builder, with the months passed as a query parameter
+        eqs_query, query_parameters = builder.build_parameterized_query("chainlink", "eqs", months=3)
+        
+        # Execute the custom query
+        print("Executing custom query (this may take some time)...")
+        result_df = dune.execute_custom_query(eqs_query, query_parameters)
+        
+        if result_df is not None and not result_df.empty:
+            # Print results info
+            print(f"Query executed successfully. Found {len(result_df)} rows")
+            print("\nSample data (first 3 rows):")
+            print(result_df.head(3))
+            
+            return result_df
+        else:
+            print("No results returned or using synthetic data")
+            return None
+            
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return None
+
 if __name__ == "__main__":
     # Run tests
     print("=== DUNE API TEST SCRIPT ===")
@@ -147,9 +177,11 @@ if __name__ == "__main__":
     
     # Test with execute_query (optional - commented out to avoid creating new queries)
     # execute_result = test_with_execute_query()
+    # parameterized_result = test_with_parameterized_query()
     
     print("\n=== TEST SUMMARY ===")
     print(f"Direct client test: {'Success' if direct_result else 'Failed'}")
     print(f"Query builder test: {'Success' if builder_result else 'Failed'}")
     print(f"Processor test: {'Success' if processor_result else 'Failed'}")
-    # print(f"Execute query test: {'Success' if execute_result else 'Failed'}")
\ No newline at end of file
+    # print(f"Execute query test: {'Success' if execute_result else 'Failed'}")
+    # print(f"Parameterized query test: {'Success' if parameterized_result else 'Failed'}")
\ No newline at end of file
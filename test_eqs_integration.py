@@ -3,10 +3,10 @@ Test script for integrating our improved EQS calculator with the Dune processor.
 This uses the EQS sample data and performs a direct integration test.
 """
 
+import numpy as np
 import pandas as pd
 import logging
 from improved_eqs_calculator import EnhancedEQSCalculator, integrate_with_dune_processor
-from datetime import datetime
 import sys
 
 # Configure logging
@@ -49,35 +49,29 @@ class SimpleDuneProcessor:
 
 def create_chainlink_sample_data():
     """Create a DataFrame based on the sample Chainlink data from Dune."""
-    # Data based on the eqs-chainlink sampledune.txt file
-    data = [
-        # First month (April 2024)
-        {'month': datetime(2024, 4, 1), 'source': 'automation', 'total_fees': 67939.46084758072, 'mom_change': None, 
-         'avg_mom_change': -0.08008760931758903, 'stddev_mom_change': 0.5116151413977408, 'num_months': 13},
-        {'month': datetime(2024, 4, 1), 'source': 'ccip', 'total_fees': 98848.54011158487, 'mom_change': None, 
-         'avg_mom_change': 0.009141157048100923, 'stddev_mom_change': 0.6596989982341107, 'num_months': 13},
-        {'month': datetime(2024, 4, 1), 'source': 'fm', 'total_fees': 2219711.501320376, 'mom_change': None, 
-         'avg_mom_change': -0.20989551767904832, 'stddev_mom_change': 0.4108114361781297, 'num_months': 13},
-        {'month': datetime(2024, 4, 1), 'source': 'ocr', 'total_fees': 3395286.256855447, 'mom_change': None, 
-         'avg_mom_change': -0.22781204525964827, 'stddev_mom_change': 0.421958290453829, 'num_months': 13},
-        {'month': datetime(2024, 4, 1), 'source': 'vrf', 'total_fees': 31244.752470117477, 'mom_change': None, 
-         'avg_mom_change': -0.2036716821229518, 'stddev_mom_change': 0.3310369401263438, 'num_months': 13},
-        
-        # Second month (May 2024)
-        {'month': datetime(2024, 5, 1), 'source': 'automation', 'total_fees': 65326.42687327729, 'mom_change': -0.03846121152132275, 
-         'avg_mom_change': -0.08008760931758903, 'stddev_mom_change': 0.5116151413977408, 'num_months': 13},
-        {'month': datetime(2024, 5, 1), 'source': 'ccip', 'total_fees': 75257.5047921389, 'mom_change': -0.23865840904494182, 
-         'avg_mom_change': 0.009141157048100923, 'stddev_mom_change': 0.6596989982341107, 'num_months': 13},
-        {'month': datetime(2024, 5, 1), 'source': 'fm', 'total_fees': 2199732.3881992646, 'mom_change': -0.009000770194336972, 
-         'avg_mom_change': -0.20989551767904832, 'stddev_mom_change': 0.4108114361781297, 'num_months': 13},
-        {'month': datetime(2024, 5, 1), 'source': 'ocr', 'total_fees': 3152587.491741491, 'mom_change': -0.0714810907692749, 
-         'avg_mom_change': -0.22781204525964827, 'stddev_mom_change': 0.421958290453829, 'num_months': 13},
-        {'month': datetime(2024, 5, 1), 'source': 'vrf', 'total_fees': 20580.17782983342, 'mom_change': -0.3413237038918349, 
-         'avg_mom_change': -0.2036716821229518, 'stddev_mom_change': 0.3310369401263438, 'num_months': 13}
-    ]
+    # Data based on the eqs-chainlink sampledune.txt file, as parallel typed columns
+    # (April 2024 for all five sources, then May 2024)
+    sources = ['automation', 'ccip', 'fm', 'ocr', 'vrf']
+    avg_mom_change = [-0.08008760931758903, 0.009141157048100923, -0.20989551767904832,
+                      -0.22781204525964827, -0.2036716821229518]
+    stddev_mom_change = [0.5116151413977408, 0.6596989982341107, 0.4108114361781297,
+                         0.421958290453829, 0.3310369401263438]
     
-    # Convert to DataFrame
-    df = pd.DataFrame(data)
+    df = pd.DataFrame({
+        'month': np.repeat(np.array(['2024-04-01', '2024-05-01'], dtype='datetime64[ns]'), len(sources)),
+        'source': sources * 2,
+        'total_fees': np.array([
+            67939.46084758072, 98848.54011158487, 2219711.501320376, 3395286.256855447, 31244.752470117477,
+            65326.42687327729, 75257.5047921389, 2199732.3881992646, 3152587.491741491, 20580.17782983342
+        ], dtype=np.float64),
+        'mom_change': np.array([
+            np.nan, np.nan, np.nan, np.nan, np.nan,
+            -0.03846121152132275, -0.23865840904494182, -0.009000770194336972, -0.0714810907692749, -0.3413237038918349
+        ], dtype=np.float64),
+        'avg_mom_change': np.array(avg_mom_change * 2, dtype=np.float64),
+        'stddev_mom_change': np.array(stddev_mom_change * 2, dtype=np.float64),
+        'num_months': np.full(2 * len(sources), 13, dtype=np.int64)
+    })
     return df
 
 def test_eqs_integration():
@@ -0,0 +1,50 @@
+"""
+Test script for the fused EQS kernels.
+Checks that the batch kernel reproduces the EnhancedEQSCalculator component scores.
+"""
+
+import logging
+import sys
+from improved_eqs_calculator import EnhancedEQSCalculator
+from eqs_kernels import calculate_eqs_components, NUMBA_AVAILABLE
+from test_eqs_integration import create_chainlink_sample_data
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def test_eqs_kernels():
+    """Compare batch kernel output with the pandas-based component calculations."""
+    df = create_chainlink_sample_data()
+    frames = {
+        'full': df,
+        'single_month': df[df['month'] == df['month'].min()],
+        'single_source': df[df['source'] == 'fm'],
+        'empty': df.iloc[:0]
+    }
+
+    calculator = EnhancedEQSCalculator()
+    components = calculate_eqs_components(frames)
+    print(f"\nNumba available: {NUMBA_AVAILABLE}")
+
+    for name, frame in frames.items():
+        result = components[name]
+        print(f"{name}: {result}")
+
+        if frame.empty:
+            assert result == {'stability': 50.0, 'diversification': 0.0, 'magnitude': 10.0}
+            continue
+
+        assert abs(result['stability'] - calculator._calculate_stability_score(frame)) < 1e-9
+        assert abs(result['diversification'] - calculator._calculate_diversification_score(frame)) < 1e-9
+        assert abs(result['magnitude'] - calculator._calculate_magnitude_score(frame)) < 1e-9
+
+if __name__ == "__main__":
+    print("Testing EQS kernels...")
+    try:
+        test_eqs_kernels()
+        print("\nKernel test completed successfully!")
+    except AssertionError:
+        print("\nKernel test failed.")
+        sys.exit(1)
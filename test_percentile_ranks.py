@@ -0,0 +1,47 @@
+"""
+Test script for percentile ranking of user data within categories and months.
+Checks that protocols without a category are ranked together instead of dropped.
+"""
+
+import logging
+import sys
+import pandas as pd
+from utils import calculate_group_percentile_ranks
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+METRICS = ['active_addresses', 'transaction_count', 'transaction_volume']
+
+def test_null_category_ranks():
+    """Rows with a NULL category get percentiles ranked among themselves"""
+    df = pd.DataFrame({
+        'category': ['DEX', 'DEX', None, None, None, 'Lending'],
+        'month': pd.to_datetime(['2025-01-01'] * 6),
+        'active_addresses': [10, 20, 5, 15, 25, 7],
+        'transaction_count': [1, 2, 3, 2, 1, 9],
+        'transaction_volume': [100.0, 50.0, 10.0, 30.0, 20.0, 5.0],
+    })
+
+    ranks = calculate_group_percentile_ranks(df, ['category', 'month'], METRICS)
+    print(ranks)
+
+    assert not ranks.isna().any().any()
+    assert ranks['active_addresses'].tolist() == [0.5, 1.0, 1 / 3, 2 / 3, 1.0, 1.0]
+    assert ranks['transaction_count'].tolist() == [0.5, 1.0, 1.0, 2 / 3, 1 / 3, 1.0]
+
+    # Ranking the uncategorised rows on their own gives the same percentiles
+    uncategorised = df[df['category'].isna()].fillna({'category': ''})
+    expected = calculate_group_percentile_ranks(uncategorised, ['category', 'month'], METRICS)
+    pd.testing.assert_frame_equal(ranks.loc[expected.index], expected)
+
+if __name__ == "__main__":
+    print("Testing percentile ranks...")
+    try:
+        test_null_category_ranks()
+        print("\nPercentile rank test completed successfully!")
+    except AssertionError:
+        print("\nPercentile rank test failed.")
+        sys.exit(1)
@@ -0,0 +1,76 @@
+"""
+Test script for keyset pagination of the protocols list.
+Pages through a seeded SQLite database where some protocols have no How3 score.
+"""
+
+import importlib
+import re
+import sys
+import logging
+
+import pytest
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+NEXT_LINK = re.compile(r'href="([^"]*after=[^"]*)">Next page')
+ROW_LINK = re.compile(r'data-href="/protocol/(\d+)"')
+
+@pytest.fixture
+def paged_app(tmp_path, monkeypatch):
+    """Import the app against a throwaway SQLite database, with small pages"""
+    # The app reads its configuration when it is first imported, so the environment
+    # only needs to be in place for the import
+    db_path = tmp_path / 'protocols.db'
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{db_path}")
+    monkeypatch.setenv('SESSION_SECRET', 'test')
+    monkeypatch.setenv('DISABLE_SCHEDULER', 'true')
+    app_module = importlib.import_module('app')
+    routes = importlib.import_module('routes')
+    with app_module.app.app_context():
+        assert app_module.db.engine.url.database == str(db_path), "app was imported against another database"
+
+    monkeypatch.setattr(routes, 'PROTOCOLS_PER_PAGE', 5)
+    return app_module.app, app_module.db
+
+def collect_protocol_ids(client, url):
+    """Follow Next page links from url and return every protocol id listed"""
+    seen = []
+    for _ in range(100):
+        html = client.get(url).get_data(as_text=True)
+        seen.extend(int(pid) for pid in ROW_LINK.findall(html))
+        match = NEXT_LINK.search(html)
+        if not match:
+            return seen
+        url = match.group(1).replace('&amp;', '&')
+    raise AssertionError("Pagination did not terminate")
+
+def test_protocol_pagination(paged_app):
+    """Every scored protocol, including those with NULL scores, appears exactly once"""
+    from models import Protocol, Score
+
+    app, db = paged_app
+    with app.app_context():
+        for i in range(43):
+            protocol = Protocol(name=f"Paged{i}", symbol=f"PG{i}", category="DEX",
+                                market_cap=1000000.0, annual_revenue=100000.0)
+            db.session.add(protocol)
+            db.session.flush()
+            db.session.add(Score(protocol_id=protocol.id,
+                                 how3_score=None if i % 5 == 0 else float(i % 7) * 10,
+                                 earnings_quality_score=50.0, user_growth_score=None,
+                                 fair_value_score=50.0, safety_score=50.0))
+        db.session.commit()
+        expected = sorted(pid for (pid,) in db.session.query(Score.protocol_id).all())
+
+    client = app.test_client()
+    for sort_order in ('desc', 'asc'):
+        seen = collect_protocol_ids(client, f"/protocols?sort_by=how3_score&sort_order={sort_order}")
+        print(f"{sort_order}: {len(seen)} of {len(expected)} protocols")
+        assert sorted(seen) == expected
+
+if __name__ == "__main__":
+    print("Testing protocol pagination...")
+    sys.exit(pytest.main([__file__, "-q"]))
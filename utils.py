@@ -1,6 +1,12 @@
 import numpy as np
 import logging
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
 logger = logging.getLogger(__name__)
 
 def normalize_score(value, min_val, max_val):
@@ -58,6 +64,23 @@ def calculate_percentile_rank(values, target_value):
         logger.error(f"Error calculating percentile rank: {str(e)}")
         return 0
 
+def calculate_group_percentile_ranks(df, group_columns, value_columns):
+    """
+    Calculate the percentile ranks of columns within groups of a DataFrame
+    
+    Rows with a missing group key (e.g. a protocol without a category) are ranked
+    together as their own group rather than dropped.
+    
+    Parameters:
+    df (DataFrame): The data to rank
+    group_columns (list): Columns whose values define the groups
+    value_columns (list): Columns to rank within each group
+    
+    Returns:
+    DataFrame: Percentile ranks between 0 and 1, aligned with df's index
+    """
+    return df.groupby(group_columns, dropna=False)[value_columns].rank(pct=True)
+
 def format_large_number(num):
     """
     Format large numbers in a readable format (K, M, B)
@@ -111,3 +134,21 @@ def calculate_moving_average(values, window=3):
     except Exception as e:
         logger.error(f"Error calculating moving average: {str(e)}")
         return values
+
+def write_csv(df, path):
+    """
+    Write a DataFrame to CSV without its index, using pyarrow's columnar writer when available
+    
+    Parameters:
+    df (DataFrame): The data to write
+    path (str): Destination file path
+    """
+    if pa is None:
+        df.to_csv(path, index=False)
+        return
+    
+    # Arrow writes datetimes as full nanosecond timestamps; format them as DataFrame.to_csv does
+    date_cols = df.select_dtypes(include=['datetime', 'datetimetz']).columns
+    if len(date_cols):
+        df = df.assign(**{col: df[col].astype(str).where(df[col].notna()) for col in date_cols})
+    pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), path)